@@ -1,13 +1,27 @@
+import argparse
 import boto3
 import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from bedrock_cache import ResponseCache, make_cache_key
+from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, default_scheduler, estimate_tokens, scheduled_client
 
 # Define constants for model configuration
 MODEL_ID = 'meta.llama3-8b-instruct-v1:0'  # Model ID for Meta Llama 3 8B Instruct
 REGION = 'us-east-1'
 
-# Create the Boto3 client for Bedrock Runtime
-bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
+# Create the Boto3 client for Bedrock Runtime, with its calls limited by the shared quota scheduler
+# The connection pool is sized for the concurrent batch mode (the default pool holds only 10 connections)
+bedrock_client = scheduled_client(boto3.client(
+    "bedrock-runtime",
+    region_name=REGION,
+    config=SCHEDULER_CLIENT_CONFIG.merge(Config(max_pool_connections=50))
+))
 
 # Inference configuration settings
 DEFAULT_INFERENCE_CONFIG = {
@@ -16,6 +30,473 @@ DEFAULT_INFERENCE_CONFIG = {
     "topP": 0.75
 }
 
+# Stream tokens to the terminal as they are generated instead of waiting for the full completion
+ENABLE_STREAMING = True
+
+# Conversation history settings for the Interactive Conversation Mode
+HISTORY_TOKEN_BUDGET = 1500  # Estimated tokens of history (summary + kept turns) re-sent on each turn
+HISTORY_MAX_TURNS = 8  # Sliding window: maximum number of question/answer pairs kept verbatim
+SUMMARY_MAX_TOKENS = 200  # Upper bound for the running summary of older turns
+
+# Batch mode settings (python 01_test_fm.py --batch prompts.jsonl)
+BATCH_MAX_WORKERS = 8  # Requests in flight at the same time
+BATCH_PROMPT_FIELDS = ("prompt", "question", "text", "body")  # First field found in each record is used as the prompt
+BATCH_ID_FIELDS = ("id", "request_id")  # First field found in each record is used as the record ID
+
+# Response cache settings (see bedrock_cache.py)
+ENABLE_RESPONSE_CACHE = False  # Cache responses of deterministic requests (temperature 0)
+FORCE_RESPONSE_CACHE = False  # Also cache requests with temperature > 0 (repeated prompts get the same answer)
+RESPONSE_CACHE_DIR = ".bedrock_cache"  # Persistent tier; set to None to keep the cache in memory only
+response_cache = ResponseCache(cache_dir=RESPONSE_CACHE_DIR)
+
+# Function to build the native Llama 3 request used by the Single-Turn Message Mode
+def build_native_request(user_question):
+    formatted_prompt = f"""
+<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+{user_question}
+<|eot_id|>
+<|start_header_id|>assistant<|end_header_id|>
+"""
+    return {
+        "prompt": formatted_prompt,
+        "max_gen_len": 50,
+        "temperature": 0.1,
+        "top_p": 0.9
+    }
+
+# Function to return the cache key of a request, or None when its response must not be cached
+def get_response_cache_key(api, payload, temperature):
+    if not ENABLE_RESPONSE_CACHE:
+        return None
+    # Only deterministic requests are cached, unless caching is explicitly forced
+    if temperature != 0 and not FORCE_RESPONSE_CACHE:
+        return None
+    return make_cache_key(MODEL_ID, api, payload)
+
+# Function to build the cache key of a Converse request
+def get_converse_cache_key(messages, system, inference_config):
+    payload = {"messages": messages, "system": system or [], "inferenceConfig": inference_config}
+    return get_response_cache_key("converse", payload, inference_config.get("temperature"))
+
+# Function to build the cache key of a native InvokeModel request
+def get_invoke_model_cache_key(native_request):
+    return get_response_cache_key("invoke_model", native_request, native_request.get("temperature"))
+
+# Function to send a conversation with the Converse API and return the raw response
+def converse_once(messages, system=None, inference_config=DEFAULT_INFERENCE_CONFIG):
+    cache_key = get_converse_cache_key(messages, system, inference_config)
+    if cache_key:
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+    request = {"modelId": MODEL_ID, "messages": messages, "inferenceConfig": inference_config}
+    if system:
+        request["system"] = system
+    response = bedrock_client.converse(**request)
+
+    if cache_key:
+        response_cache.put(cache_key, {key: value for key, value in response.items() if key != "ResponseMetadata"})
+    return response
+
+# Function to send a native request with the InvokeModel API and return the decoded model response
+def invoke_model_once(native_request):
+    cache_key = get_invoke_model_cache_key(native_request)
+    if cache_key:
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+    response = bedrock_client.invoke_model(
+        modelId=MODEL_ID,
+        body=json.dumps(native_request)
+    )
+    model_response = json.loads(response["body"].read())
+
+    if cache_key:
+        response_cache.put(cache_key, model_response)
+    return model_response
+
+# Function to print the hit/miss counters of the response cache
+def print_cache_stats():
+    if not ENABLE_RESPONSE_CACHE:
+        return
+    stats = response_cache.stats()
+    print(f"[cache] hits: {stats['hits']} (memory: {stats['memory_hits']}, disk: {stats['disk_hits']})"
+          f" | misses: {stats['misses']} | hit rate: {stats['hit_rate']:.1%}")
+
+# Function to fold old conversation turns into the running summary using the model itself
+def summarize_turns(previous_summary, turns):
+    """
+    Asks the model to merge evicted turns into the running summary of the conversation.
+
+    :param previous_summary: Current summary text (may be empty)
+    :param turns: List of (question, answer) tuples being removed from the window
+    :return: The updated summary text
+    """
+    transcript = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+    prompt = (
+        "Update the summary of a conversation with the new exchanges below. "
+        "Keep names, facts and decisions; be concise. Reply with the summary only.\n\n"
+        f"Current summary:\n{previous_summary or '(empty)'}\n\nNew exchanges:\n{transcript}"
+    )
+    response = converse_once(
+        [{"role": "user", "content": [{"text": prompt}]}],
+        inference_config={"maxTokens": SUMMARY_MAX_TOKENS, "temperature": 0}
+    )
+    return response['output']['message']['content'][0]['text'].strip()
+
+class ConversationHistory:
+    """
+    Keeps the context of the Interactive Conversation Mode within a token budget.
+
+    The most recent turns are re-sent verbatim (sliding window). When the window exceeds
+    HISTORY_MAX_TURNS or the estimated token budget, the oldest turns are folded into a
+    running summary that is sent as the system prompt, so the payload per turn stays bounded.
+    """
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, max_turns=HISTORY_MAX_TURNS,
+                 summary_max_tokens=SUMMARY_MAX_TOKENS, summarizer=summarize_turns):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        self.turns = []  # List of (question, answer, estimated_tokens)
+        self.summary = ""
+
+    def estimated_tokens(self):
+        return estimate_tokens(self.summary) + sum(tokens for _, _, tokens in self.turns)
+
+    def build_messages(self, user_question):
+        """
+        Builds the Converse messages for the next question.
+
+        :param user_question: The new question from the user
+        :return: List of messages in the Converse API format
+        """
+        messages = []
+        for question, answer, _ in self.turns:
+            messages.append({"role": "user", "content": [{"text": question}]})
+            messages.append({"role": "assistant", "content": [{"text": answer}]})
+        messages.append({"role": "user", "content": [{"text": user_question}]})
+        return messages
+
+    def build_system(self):
+        """
+        :return: The system prompt carrying the running summary, or an empty list if there is none
+        """
+        if not self.summary:
+            return []
+        return [{"text": f"Summary of the earlier conversation with the user:\n{self.summary}"}]
+
+    def add_turn(self, user_question, assistant_response):
+        """
+        Records a completed turn and enforces the window and token budget.
+
+        :param user_question: The question that was answered
+        :param assistant_response: The answer returned by the model
+        """
+        tokens = estimate_tokens(user_question) + estimate_tokens(assistant_response)
+        self.turns.append((user_question, assistant_response, tokens))
+        if len(self.turns) > self.max_turns or self.estimated_tokens() > self.token_budget:
+            self._fold_oldest_turns()
+
+    def _fold_oldest_turns(self):
+        # Evict down to half of the window/budget at once, so the summarization call is amortized over several turns
+        target_turns = max(1, self.max_turns // 2)
+        target_tokens = self.token_budget // 2
+        evicted = []
+        while len(self.turns) > 1 and (len(self.turns) > target_turns or self.estimated_tokens() > target_tokens):
+            question, answer, _ = self.turns.pop(0)
+            evicted.append((question, answer))
+        if not evicted:
+            return
+
+        try:
+            summary = self.summarizer(self.summary, evicted)
+        except (ClientError, Exception) as error:
+            # Fall back to a plain transcript so the context is not silently lost
+            print(f"WARNING: Failed to summarize older turns, keeping a truncated transcript. Details: {error}")
+            summary = " ".join([self.summary] + [f"User: {q} Assistant: {a}" for q, a in evicted]).strip()
+
+        # Keep the most recent part of the summary if it still exceeds its own limit (never more than half the budget)
+        max_chars = min(self.summary_max_tokens, self.token_budget // 2) * 4
+        self.summary = summary[-max_chars:]
+
+# Function to compute the latency metrics of a streamed turn
+def build_stream_metrics(start_time, first_token_time, end_time, output_tokens):
+    """
+    Summarizes the timing of a streamed response.
+
+    :param start_time: perf_counter value taken right before the request was sent
+    :param first_token_time: perf_counter value when the first text token arrived (None if nothing arrived)
+    :param end_time: perf_counter value when the stream finished
+    :param output_tokens: Number of generated tokens reported by the service
+    :return: Dictionary with time-to-first-token, total latency (seconds) and tokens/sec
+    """
+    time_to_first_token = (first_token_time - start_time) if first_token_time is not None else None
+    generation_time = (end_time - first_token_time) if first_token_time is not None else 0
+    # Tokens/sec is measured over the generation phase only, so it is not skewed by the queueing/prefill time
+    tokens_per_second = output_tokens / generation_time if output_tokens and generation_time > 0 else None
+    return {
+        "time_to_first_token": time_to_first_token,
+        "total_latency": end_time - start_time,
+        "output_tokens": output_tokens,
+        "tokens_per_second": tokens_per_second
+    }
+
+# Function to print the metrics returned by build_stream_metrics
+def print_stream_metrics(metrics):
+    ttft = metrics["time_to_first_token"]
+    tps = metrics["tokens_per_second"]
+    print(
+        f"[metrics] time to first token: {f'{ttft * 1000:.0f} ms' if ttft is not None else 'n/a'}"
+        f" | total latency: {metrics['total_latency'] * 1000:.0f} ms"
+        f" | output tokens: {metrics['output_tokens'] if metrics['output_tokens'] is not None else 'n/a'}"
+        f" | tokens/sec: {f'{tps:.1f}' if tps is not None else 'n/a'}"
+    )
+
+# Function to stream a Converse API response, printing each text delta as it arrives
+def stream_converse(messages, inference_config=DEFAULT_INFERENCE_CONFIG, system=None):
+    """
+    Sends the conversation with ConverseStream and prints the answer incrementally.
+
+    :param messages: Conversation messages in the Converse API format
+    :param inference_config: Inference configuration passed to the model
+    :param system: Optional system prompt blocks
+    :return: Tuple with the complete assistant text and the turn metrics
+    """
+    start_time = time.perf_counter()
+    cache_key = get_converse_cache_key(messages, system, inference_config)
+    if cache_key:
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            text = cached_response['output']['message']['content'][0]['text']
+            print(text)
+            end_time = time.perf_counter()
+            output_tokens = cached_response.get("usage", {}).get("outputTokens")
+            return text, build_stream_metrics(start_time, end_time, end_time, output_tokens)
+
+    request = {"modelId": MODEL_ID, "messages": messages, "inferenceConfig": inference_config}
+    if system:
+        request["system"] = system
+    response = bedrock_client.converse_stream(**request)
+
+    first_token_time = None
+    output_tokens = None
+    text_parts = []
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text", "")
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                print(text, end="", flush=True)
+                text_parts.append(text)
+        elif "metadata" in event:
+            output_tokens = event["metadata"].get("usage", {}).get("outputTokens")
+    end_time = time.perf_counter()
+    print()
+
+    text = "".join(text_parts)
+    if cache_key:
+        # Stored in the same shape as a Converse response, so streaming and blocking calls share entries
+        response_cache.put(cache_key, {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "usage": {"outputTokens": output_tokens}
+        })
+    return text, build_stream_metrics(start_time, first_token_time, end_time, output_tokens)
+
+# Function to stream a native InvokeModel response, printing each generated chunk as it arrives
+def stream_invoke_model(native_request):
+    """
+    Sends a native request with InvokeModelWithResponseStream and prints the generation incrementally.
+
+    :param native_request: Model-specific request body
+    :return: Tuple with the complete generated text and the turn metrics
+    """
+    start_time = time.perf_counter()
+    cache_key = get_invoke_model_cache_key(native_request)
+    if cache_key:
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            text = cached_response["generation"]
+            print(text)
+            end_time = time.perf_counter()
+            return text, build_stream_metrics(start_time, end_time, end_time, cached_response.get("generation_token_count"))
+
+    response = bedrock_client.invoke_model_with_response_stream(
+        modelId=MODEL_ID,
+        body=json.dumps(native_request)
+    )
+
+    first_token_time = None
+    output_tokens = None
+    text_parts = []
+    for event in response["body"]:
+        chunk = json.loads(event["chunk"]["bytes"])
+        text = chunk.get("generation", "")
+        if text:
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            print(text, end="", flush=True)
+            text_parts.append(text)
+        # The last chunk carries the invocation metrics computed by Bedrock
+        invocation_metrics = chunk.get("amazon-bedrock-invocationMetrics")
+        if invocation_metrics:
+            output_tokens = invocation_metrics.get("outputTokenCount")
+    end_time = time.perf_counter()
+    print()
+
+    text = "".join(text_parts)
+    if cache_key:
+        # Stored in the same shape as an InvokeModel response, so streaming and blocking calls share entries
+        response_cache.put(cache_key, {"generation": text, "generation_token_count": output_tokens})
+    return text, build_stream_metrics(start_time, first_token_time, end_time, output_tokens)
+
+# Function to read the IDs already answered in a batch output file, so an interrupted run can resume
+def load_completed_batch_ids(output_path):
+    """
+    Collects the IDs of the records that were already answered successfully.
+
+    A line left half-written by a crash is removed from the end of the file, so new results can be appended safely.
+    Records that failed are not considered completed and are sent again.
+
+    :param output_path: Path of the batch output JSONL file
+    :return: Set of completed record IDs
+    """
+    completed_ids = set()
+    if not os.path.exists(output_path):
+        return completed_ids
+
+    with open(output_path, "rb+") as output_file:
+        valid_length = 0
+        for line in output_file:
+            if not line.endswith(b"\n"):
+                break
+            valid_length += len(line)
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("error") is None:
+                completed_ids.add(result.get("id"))
+        output_file.truncate(valid_length)
+    return completed_ids
+
+# Generator that streams the prompts of a batch input JSONL file without loading it in memory
+def read_batch_records(input_path):
+    with open(input_path, encoding="utf-8") as input_file:
+        for line_number, line in enumerate(input_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                print(f"WARNING: Skipping invalid JSON on line {line_number}. Details: {error}")
+                continue
+            record_id = next((str(record[field]) for field in BATCH_ID_FIELDS if record.get(field) is not None), f"line-{line_number}")
+            prompt = next((record[field] for field in BATCH_PROMPT_FIELDS if record.get(field)), None)
+            yield record_id, prompt
+
+# Function to answer one batch record with the Converse or InvokeModel API
+def run_batch_record(record_id, prompt, mode):
+    """
+    Sends a single prompt and builds the result line written to the output file.
+
+    :param record_id: ID of the input record
+    :param prompt: Prompt text
+    :param mode: 'converse' or 'invoke'
+    :return: Dictionary with the output text, latency, token usage and error (if any)
+    """
+    result = {"id": record_id, "mode": mode, "output": None, "latency_ms": None,
+              "input_tokens": None, "output_tokens": None, "error": None}
+    start_time = time.perf_counter()
+    try:
+        if not prompt:
+            raise ValueError(f"No prompt found in any of the fields {BATCH_PROMPT_FIELDS}")
+        if mode == "converse":
+            response = converse_once([{"role": "user", "content": [{"text": prompt}]}])
+            result["output"] = response['output']['message']['content'][0]['text']
+            result["input_tokens"] = response.get("usage", {}).get("inputTokens")
+            result["output_tokens"] = response.get("usage", {}).get("outputTokens")
+        else:
+            model_response = invoke_model_once(build_native_request(prompt))
+            result["output"] = model_response["generation"]
+            result["input_tokens"] = model_response.get("prompt_token_count")
+            result["output_tokens"] = model_response.get("generation_token_count")
+    except (ClientError, Exception) as error:
+        result["error"] = str(error)
+    result["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    return result
+
+# Function to run every prompt of a JSONL file through the model with a bounded worker pool
+def run_batch(input_path, output_path, mode="converse", max_workers=BATCH_MAX_WORKERS):
+    """
+    Non-interactive batch mode. Results are appended to the output file as soon as each request finishes
+    (in completion order), so a crashed run can be restarted with the same arguments and skips finished records.
+
+    :param input_path: JSONL file with one prompt per line
+    :param output_path: JSONL file receiving one result per line
+    :param mode: 'converse' or 'invoke'
+    :param max_workers: Number of concurrent requests
+    """
+    completed_ids = load_completed_batch_ids(output_path)
+    if completed_ids:
+        print(f"Resuming batch: {len(completed_ids)} records already completed in '{output_path}'.")
+
+    # At most two records per worker are waiting in memory, so huge input files are streamed
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    write_lock = threading.Lock()
+    counters = {"done": 0, "errors": 0, "skipped": 0}
+    start_time = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output_file:
+
+        def write_result(future):
+            result = future.result()
+            with write_lock:
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output_file.flush()
+                counters["done"] += 1
+                if result["error"] is not None:
+                    counters["errors"] += 1
+                if counters["done"] % 100 == 0:
+                    print(f"{counters['done']} records processed ({counters['errors']} errors).")
+            in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for record_id, prompt in read_batch_records(input_path):
+                if record_id in completed_ids:
+                    counters["skipped"] += 1
+                    continue
+                in_flight.acquire()
+                executor.submit(run_batch_record, record_id, prompt, mode).add_done_callback(write_result)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Batch finished: {counters['done']} processed, {counters['errors']} errors, "
+          f"{counters['skipped']} skipped (already completed) in {elapsed:.1f} s.")
+    print_cache_stats()
+    for quota_group, stats in default_scheduler.stats().items():
+        print(f"[scheduler] {quota_group}: {stats['requests']} requests, {stats['throttles']} throttles")
+
+# Command-line options; without --batch the interactive menu below is started
+parser = argparse.ArgumentParser(description="AWS Bedrock Interactive Program")
+parser.add_argument("--batch", metavar="INPUT_JSONL", help="Run every prompt of a JSONL file without the interactive menu")
+parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file receiving the batch results (default: batch_results.jsonl)")
+parser.add_argument("--mode", choices=["converse", "invoke"], default="converse", help="API used by the batch mode (default: converse)")
+parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help=f"Concurrent requests in batch mode (default: {BATCH_MAX_WORKERS})")
+parser.add_argument("--cache", action="store_true", help="Cache responses of deterministic requests (temperature 0)")
+parser.add_argument("--force-cache", action="store_true", help="Cache responses regardless of the temperature")
+args = parser.parse_args()
+
+ENABLE_RESPONSE_CACHE = ENABLE_RESPONSE_CACHE or args.cache or args.force_cache
+FORCE_RESPONSE_CACHE = FORCE_RESPONSE_CACHE or args.force_cache
+
+if args.batch:
+    run_batch(args.batch, args.output, mode=args.mode, max_workers=args.workers)
+    sys.exit(0)
+
 print("Welcome to the AWS Bedrock Interactive Program!")
 print("Choose one of the following modes to interact with the model:")
 
@@ -28,7 +509,7 @@ while True:
 
     if main_choice == "1":
         print("\n--- Interactive Conversation Mode ---")
-        conversation_history = []
+        conversation_history = ConversationHistory()
 
         while True:
             print("\nMenu:")
@@ -39,18 +520,21 @@ while True:
             if user_choice == "1":
                 user_question = input("Enter your question: ")
                 try:
-                    conversation_history.append({"role": "user", "content": [{"text": user_question}]})
+                    messages = conversation_history.build_messages(user_question)
+                    system = conversation_history.build_system()
 
-                    response = bedrock_client.converse(
-                        modelId=MODEL_ID,
-                        messages=conversation_history,
-                        inferenceConfig=DEFAULT_INFERENCE_CONFIG
-                    )
+                    if ENABLE_STREAMING:
+                        print("Assistant: ", end="", flush=True)
+                        assistant_response, metrics = stream_converse(messages, system=system)
+                        print_stream_metrics(metrics)
+                    else:
+                        response = converse_once(messages, system=system)
 
-                    assistant_response = response['output']['message']['content'][0]['text']
-                    print(f"Assistant: {assistant_response}")
+                        assistant_response = response['output']['message']['content'][0]['text']
+                        print(f"Assistant: {assistant_response}")
 
-                    conversation_history.append({"role": "assistant", "content": [{"text": assistant_response}]})
+                    # The turn is only recorded once answered, so a failed call does not leave a dangling question
+                    conversation_history.add_turn(user_question, assistant_response)
 
                 except (ClientError, Exception) as error:
                     print(f"ERROR: Failed to interact with the model. Details: {error}")
@@ -71,29 +555,17 @@ while True:
 
             if user_choice == "1":
                 user_question = input("Enter your question: ")
-
-                formatted_prompt = f"""
-<|begin_of_text|><|start_header_id|>user<|end_header_id|>
-{user_question}
-<|eot_id|>
-<|start_header_id|>assistant<|end_header_id|>
-"""
-                native_request = {
-                    "prompt": formatted_prompt,
-                    "max_gen_len": 50,
-                    "temperature": 0.1,
-                    "top_p": 0.9
-                }
+                native_request = build_native_request(user_question)
 
                 try:
-                    response = bedrock_client.invoke_model(
-                        modelId=MODEL_ID,
-                        body=json.dumps(native_request)
-                    )
-
-                    model_response = json.loads(response["body"].read())
-                    generated_text = model_response["generation"]
-                    print(f"Assistant: {generated_text}")
+                    if ENABLE_STREAMING:
+                        print("Assistant: ", end="", flush=True)
+                        generated_text, metrics = stream_invoke_model(native_request)
+                        print_stream_metrics(metrics)
+                    else:
+                        model_response = invoke_model_once(native_request)
+                        generated_text = model_response["generation"]
+                        print(f"Assistant: {generated_text}")
 
                 except (ClientError, Exception) as error:
                     print(f"ERROR: Failed to invoke the model. Details: {error}")
@@ -104,6 +576,9 @@ while True:
                 print("Invalid input. Please enter 1 or 2.")
 
     elif main_choice == "3":
+        print_cache_stats()
+        for quota_group, stats in default_scheduler.stats().items():
+            print(f"[scheduler] {quota_group}: {stats['requests']} requests, {stats['throttles']} throttles")
         print("Exiting the program. Goodbye!")
         break
 
@@ -1,9 +1,70 @@
 import boto3
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from bedrock_resolver import BedrockResourceResolver
+from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, scheduled_client
 
 # Initialize the Boto3 clients
 bedrock_agent_client = boto3.client('bedrock-agent')
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
+bedrock_agent_runtime_client = scheduled_client(boto3.client('bedrock-agent-runtime', config=SCHEDULER_CLIENT_CONFIG))
+
+# Cached name -> ID lookups, so queries do not list the knowledge bases every time
+resource_resolver = BedrockResourceResolver(bedrock_agent_client=bedrock_agent_client)
+
+# Serve the knowledge bases below from an in-process index instead of calling retrieve() (requires NumPy)
+# Useful for small corpora and for running this script without AWS resources.
+# The sample documents of the tutorial are indexed as 'athletes-knowledge-bases' and 'musicians-knowledge-bases'.
+USE_LOCAL_KNOWLEDGE_BASES = False
+if USE_LOCAL_KNOWLEDGE_BASES:
+    from bedrock_local_retrieval import create_local_retrieval_client
+    # Local knowledge bases use their name as ID
+    bedrock_agent_runtime_client = create_local_retrieval_client()
+
+# Reuse the results of an earlier query with the same meaning instead of calling retrieve() again (requires NumPy)
+# Queries are compared with Titan embeddings; the local mode compares them by word overlap, without AWS
+ENABLE_SEMANTIC_CACHE = False
+if ENABLE_SEMANTIC_CACHE:
+    from bedrock_semantic_cache import SemanticQueryCache
+    if USE_LOCAL_KNOWLEDGE_BASES:
+        semantic_cache = SemanticQueryCache()
+    else:
+        from bedrock_local_retrieval import TitanEmbedder
+        bedrock_runtime_client = scheduled_client(boto3.client('bedrock-runtime', config=SCHEDULER_CLIENT_CONFIG))
+        semantic_cache = SemanticQueryCache(TitanEmbedder(bedrock_runtime_client))
+
+# Define an appropriate relevance threshold. The local index scores by clipped cosine similarity of word
+# counts, so its scores are lower than those of Bedrock (0.15 separates the sample queries, see bedrock_kb_benchmark.py --local)
+RELEVANCE_THRESHOLD = 0.15 if USE_LOCAL_KNOWLEDGE_BASES else 0.5
+MAX_FAN_OUT_WORKERS = 16  # Maximum number of knowledge bases queried at the same time
+
+# Function to retrieve the ID of a knowledge base by its name
+def get_knowledge_base_id(knowledge_base_name):
+    if USE_LOCAL_KNOWLEDGE_BASES:
+        return knowledge_base_name if knowledge_base_name in bedrock_agent_runtime_client.knowledge_bases else None
+    return resource_resolver.knowledge_base_id(knowledge_base_name)
+
+# Function to retrieve the results of a query, served from the semantic cache when a similar query was seen
+def retrieve_results(knowledge_base_id, query, number_of_results):
+    if ENABLE_SEMANTIC_CACHE:
+        cached_results = semantic_cache.lookup(knowledge_base_id, query, number_of_results)
+        if cached_results is not None:
+            return cached_results
+
+    response = bedrock_agent_runtime_client.retrieve(
+        knowledgeBaseId=knowledge_base_id,
+        retrievalQuery={'text': query},
+        retrievalConfiguration={
+            'vectorSearchConfiguration': {
+                'numberOfResults': number_of_results
+            }
+        }
+    )
+    retrieval_results = response.get('retrievalResults', [])
+
+    if ENABLE_SEMANTIC_CACHE:
+        semantic_cache.store(knowledge_base_id, query, retrieval_results, number_of_results)
+    return retrieval_results
 
 def test_knowledge_base(knowledge_base_name, query):
     """
@@ -14,39 +75,20 @@ def test_knowledge_base(knowledge_base_name, query):
     :return: The retrieved content or an appropriate message
     """
     try:
-        # Retrieve the list of knowledge bases
-        knowledge_bases_list = bedrock_agent_client.list_knowledge_bases()
-        knowledge_bases = knowledge_bases_list.get('knowledgeBaseSummaries', [])
-
-        # Search for the knowledge base ID by name
-        knowledge_base_id = None
-        for kb in knowledge_bases:
-            if kb.get('name') == knowledge_base_name:
-                knowledge_base_id = kb.get('knowledgeBaseId')
-                break
+        # Search for the knowledge base ID by name (served from the cached index)
+        knowledge_base_id = get_knowledge_base_id(knowledge_base_name)
 
         if not knowledge_base_id:
             return f"Knowledge Base '{knowledge_base_name}' not found."
 
         # Call the retrieve function
-        response = bedrock_agent_runtime_client.retrieve(
-            knowledgeBaseId=knowledge_base_id,
-            retrievalQuery={'text': query},
-            retrievalConfiguration={
-                'vectorSearchConfiguration': {
-                    'numberOfResults': 1  # Return only the most relevant result
-                }
-            }
-        )
+        retrieval_results = retrieve_results(knowledge_base_id, query, number_of_results=1)  # Return only the most relevant result
 
         # Process and evaluate the results
-        retrieval_results = response.get('retrievalResults', [])
         if retrieval_results:
             result = retrieval_results[0]
             score = result.get('score', 0)
-            relevance_threshold = 0.5  # Define an appropriate relevance threshold
-
-            if score >= relevance_threshold:
+            if score >= RELEVANCE_THRESHOLD:
                 content = result.get('content', {}).get('text', 'No content.')
                 return content
             else:
@@ -57,6 +99,64 @@ def test_knowledge_base(knowledge_base_name, query):
     except ClientError as error:
         return f"An error occurred: {error}"
 
+# Function to retrieve the results of one knowledge base, tagged with the knowledge base they came from
+def retrieve_with_provenance(knowledge_base_name, query, number_of_results):
+    knowledge_base_id = get_knowledge_base_id(knowledge_base_name)
+    if not knowledge_base_id:
+        raise ValueError(f"Knowledge Base '{knowledge_base_name}' not found.")
+
+    # Copies, so the provenance fields are not added to the results kept in the semantic cache
+    results = [dict(result) for result in retrieve_results(knowledge_base_id, query, number_of_results)]
+    for result in results:
+        result['knowledgeBaseName'] = knowledge_base_name
+        result['knowledgeBaseId'] = knowledge_base_id
+    return results
+
+# Function to query several knowledge bases in parallel and merge their results by score
+def retrieve_from_knowledge_bases(knowledge_base_names, query, top_k=5, relevance_threshold=RELEVANCE_THRESHOLD):
+    """
+    Queries all the knowledge bases concurrently, so the total latency follows the slowest knowledge base
+    instead of the sum of all of them, and returns the best results across all of them.
+
+    :param knowledge_base_names: List of knowledge base names to query
+    :param query: The query to send to the knowledge bases
+    :param top_k: Maximum number of results returned (also requested from each knowledge base)
+    :param relevance_threshold: Minimum score, either one value for all knowledge bases or a dictionary
+                                {knowledge_base_name: threshold} (missing names use RELEVANCE_THRESHOLD)
+    :return: Up to top_k retrieval results sorted by score, each with 'knowledgeBaseName' and 'knowledgeBaseId'
+    """
+    if not knowledge_base_names:
+        return []
+
+    # Keep only the top_k best results in a min-heap while the responses arrive
+    best_results = []
+    sequence = 0  # Tie-breaker, so results with the same score are never compared
+    max_workers = min(len(knowledge_base_names), MAX_FAN_OUT_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(retrieve_with_provenance, name, query, top_k)
+            for name in knowledge_base_names
+        }
+        for name, future in futures.items():
+            try:
+                results = future.result()
+            except (ClientError, ValueError) as error:
+                print(f"An error occurred while querying '{name}': {error}")
+                continue
+
+            threshold = relevance_threshold.get(name, RELEVANCE_THRESHOLD) if isinstance(relevance_threshold, dict) else relevance_threshold
+            for result in results:
+                score = result.get('score', 0)
+                if score < threshold:
+                    continue
+                sequence += 1
+                if len(best_results) < top_k:
+                    heapq.heappush(best_results, (score, -sequence, result))
+                else:
+                    heapq.heappushpop(best_results, (score, -sequence, result))
+
+    return [result for _, _, result in sorted(best_results, reverse=True)]
+
 # Test 1: Querying a name that exists in the 'athletes-knowledge-bases'.
 # Expected result: The correct embedding/document is returned.
 result= test_knowledge_base(knowledge_base_name='athletes-knowledge-bases', query="Who is Alicia Torrence?")
@@ -71,3 +171,19 @@ print(f"Test 2 Result:\n{result}\n")
 # Expected result: No document found, as the name is not in this knowledge base.
 result= test_knowledge_base(knowledge_base_name='athletes-knowledge-bases', query="Who is Elena Rivera?")
 print(f"Test 3 Result:\n{result}\n")
+
+# Test 4: Querying both knowledge bases at the same time.
+# Expected result: Only the athletes document about Alicia Torrence is above the threshold.
+results = retrieve_from_knowledge_bases(['athletes-knowledge-bases', 'musicians-knowledge-bases'], query="Who is Alicia Torrence?", top_k=3)
+print("Test 4 Result:")
+for result in results:
+    print(f"[{result['knowledgeBaseName']}] score {result.get('score', 0):.3f}: {result.get('content', {}).get('text', 'No content.')[:100]}")
+
+# Test 5: Asking the question of Test 1 with another phrasing.
+# Expected result: The Alicia Torrence document. With ENABLE_SEMANTIC_CACHE = True, the query is compared with
+# the query of Test 1: above the similarity threshold, its results are reused without calling retrieve().
+# The statistics show whether it was a hit, and a near miss means the threshold is too strict for the embedder.
+result= test_knowledge_base(knowledge_base_name='athletes-knowledge-bases', query="Tell me about Alicia Torrence")
+print(f"Test 5 Result:\n{result}\n")
+if ENABLE_SEMANTIC_CACHE:
+    print(f"Semantic cache statistics: {semantic_cache.stats()}")
@@ -1,23 +1,44 @@
 import boto3
 from botocore.exceptions import ClientError
+from bedrock_guardrail_prefilter import GuardrailPrefilter
+from bedrock_guardrail_stream import GuardedStream
+from bedrock_guardrail_verdicts import DEFAULT_MAX_WORKERS, GuardrailVerdictCache, evaluate_texts, format_block_reason, parse_assessments, summarize_verdicts
+from bedrock_resolver import BedrockResourceResolver
+from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, scheduled_client
 # import warnings  # Uncomment if using warnings for the alternative handling method
 
+MODEL_ID = 'meta.llama3-8b-instruct-v1:0'  # Model whose streamed answers are checked with the OUTPUT guardrail
+
 # Initialize the Bedrock client
 bedrock_client = boto3.client('bedrock')
-bedrock_runtime_client = boto3.client('bedrock-runtime')
+bedrock_runtime_client = scheduled_client(boto3.client('bedrock-runtime', config=SCHEDULER_CLIENT_CONFIG))
+
+# Cached name -> ID lookups, so queries do not list the guardrails every time
+resource_resolver = BedrockResourceResolver(bedrock_client=bedrock_client)
+
+# Local pre-filter of the deterministic policies (words, regexes, recognizable PII entities).
+# A query blocked by it, or passing a guardrail that only has such policies, does not call apply_guardrail.
+ENABLE_LOCAL_PREFILTER = True
+MANAGED_WORD_LISTS = {}  # Optional {list_type: [words]}; get_guardrail does not return the contents of managed lists
+prefilters = {}  # (guardrail_id, guardrail_version) -> (updatedAt, GuardrailPrefilter or None while the guardrail cannot be read)
+
+# Cache of results keyed by guardrail ID, version, source and content hash, so repeated texts skip the network.
+# Numbered versions are cached until evicted; DRAFT results expire and are invalidated when the guardrail is updated.
+ENABLE_VERDICT_CACHE = True
+VERDICT_CACHE_DIR = None  # e.g. ".bedrock_cache/guardrails" to keep the results between runs
+verdict_cache = GuardrailVerdictCache(bedrock_client, cache_dir=VERDICT_CACHE_DIR)
 
 # Function to retrieve the guardrail ID and latest version by name
 def get_guardrail_id_by_name(guardrail_name):
     try:
-        response = bedrock_client.list_guardrails()
+        guardrail_id = resource_resolver.guardrail_id(guardrail_name)
     except ClientError as e:
         # Handle errors while listing guardrails
         print(f"Error while listing guardrails: {e}")
         return None
 
-    for guardrail in response.get('guardrails', []):
-        if guardrail.get('name') == guardrail_name:
-            return guardrail.get('id')
+    if guardrail_id:
+        return guardrail_id
             
     # Two options for handling when the guardrail is not found:
     
@@ -30,14 +51,46 @@ def get_guardrail_id_by_name(guardrail_name):
     # warnings.warn(f"Guardrail with the name '{guardrail_name}' not found.")  
     # return None
 
+# Function to build the local pre-filter of a guardrail (again when the DRAFT has been updated)
+def get_prefilter(guardrail_id, guardrail_version):
+    key = (guardrail_id, guardrail_version)
+    try:
+        # describe() remembers a failure and only retries after the check interval of the verdict cache
+        guardrail = verdict_cache.describe(guardrail_id, guardrail_version)
+    except ClientError as e:
+        # Without the configuration every query goes to apply_guardrail until a later read succeeds
+        if prefilters.get(key, (None, True))[1] is not None:
+            print(f"Error while reading guardrail configuration: {e}")
+        prefilters[key] = (None, None)
+        return None
+    if prefilters.get(key, (None, None))[1] is None or prefilters[key][0] != guardrail.get('updatedAt'):
+        prefilters[key] = (guardrail.get('updatedAt'), GuardrailPrefilter(guardrail, MANAGED_WORD_LISTS))
+    return prefilters[key][1]
+
 # Function to ask a query using the guardrail and analyze the response
-def ask_query(guardrail_name, query, guardrail_id=None, guardrail_version='DRAFT', source='INPUT'):
+# With raise_errors, a failed apply_guardrail call raises ClientError instead of returning no block reasons
+def ask_query(guardrail_name, query, guardrail_id=None, guardrail_version='DRAFT', source='INPUT', raise_errors=False):
     block_reasons = []
     # Retrieve the guardrail ID and latest version
     if not guardrail_id:
         guardrail_id = get_guardrail_id_by_name(guardrail_name)
         if not guardrail_id:
             return block_reasons
+
+    # Decide locally when the deterministic policies are enough
+    if ENABLE_LOCAL_PREFILTER:
+        prefilter = get_prefilter(guardrail_id, guardrail_version)
+        local_block_reasons = prefilter.evaluate(query, source) if prefilter else None
+        if local_block_reasons is not None:
+            return local_block_reasons
+
+    # Reuse the result of an identical earlier check
+    if ENABLE_VERDICT_CACHE:
+        revision = verdict_cache.revision(guardrail_id, guardrail_version)
+        cached = verdict_cache.get(guardrail_id, guardrail_version, source, query, revision)
+        if cached is not None:
+            return [format_block_reason(finding) for finding in cached[1] if finding.action == 'BLOCKED']
+
     try:
         # Apply the guardrail
         response = bedrock_runtime_client.apply_guardrail(
@@ -55,48 +108,78 @@ def ask_query(guardrail_name, query, guardrail_id=None, guardrail_version='DRAFT
     except ClientError as e:
         # Handle errors while applying the guardrail
         print(f"Error while applying guardrail: {e}")
+        if raise_errors:
+            raise
         return block_reasons
 
     # Analyze the response
     action = response.get('action', 'NONE')
-    if action == 'GUARDRAIL_INTERVENED':
-        assessments = response.get('assessments', [])
-        for assessment in assessments:
-            if 'topicPolicy' in assessment:
-                topics = assessment['topicPolicy'].get('topics', [])
-                for topic in topics:
-                    if topic.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Topic '{topic.get('name')}' was blocked.")
-            if 'contentPolicy' in assessment:
-                filters = assessment['contentPolicy'].get('filters', [])
-                for filter in filters:
-                    if filter.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Content filter '{filter.get('type')}' was blocked with confidence '{filter.get('confidence')}'.")
-            if 'wordPolicy' in assessment:
-                custom_words = assessment['wordPolicy'].get('customWords', [])
-                for word in custom_words:
-                    if word.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Custom word '{word.get('match')}' was blocked.")
-                managed_words = assessment['wordPolicy'].get('managedWordLists', [])
-                for word in managed_words:
-                    if word.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Managed word '{word.get('match')}' of type '{word.get('type')}' was blocked.")
-            if 'sensitiveInformationPolicy' in assessment:
-                pii_entities = assessment['sensitiveInformationPolicy'].get('piiEntities', [])
-                for entity in pii_entities:
-                    if entity.get('action') == 'BLOCKED':
-                        block_reasons.append(f"PII entity '{entity.get('type')}' was blocked.")
-                regexes = assessment['sensitiveInformationPolicy'].get('regexes', [])
-                for regex in regexes:
-                    if regex.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Regex '{regex.get('name')}' matched and was blocked.")
-            if 'contextualGroundingPolicy' in assessment:
-                filters = assessment['contextualGroundingPolicy'].get('filters', [])
-                for filter in filters:
-                    if filter.get('action') == 'BLOCKED':
-                        block_reasons.append(f"Contextual grounding filter '{filter.get('type')}' was blocked with score '{filter.get('score')}' and threshold '{filter.get('threshold')}'.")
+    findings = parse_assessments(response.get('assessments', [])) if action == 'GUARDRAIL_INTERVENED' else []
+    if ENABLE_VERDICT_CACHE:
+        verdict_cache.put(guardrail_id, guardrail_version, source, query, action, findings, revision)
+    block_reasons = [format_block_reason(finding) for finding in findings if finding.action == 'BLOCKED']
     return block_reasons
 
+# Function to check many texts with the guardrail; returns one Verdict record per text, in order
+def check_texts(guardrail_name, texts, guardrail_id=None, guardrail_version='DRAFT', source='INPUT', max_workers=DEFAULT_MAX_WORKERS):
+    if not guardrail_id:
+        guardrail_id = get_guardrail_id_by_name(guardrail_name)
+        if not guardrail_id:
+            return []
+    prefilter = get_prefilter(guardrail_id, guardrail_version) if ENABLE_LOCAL_PREFILTER else None
+    try:
+        # Texts are only packed several per request when the guardrail has no model-based policies
+        guardrail = verdict_cache.describe(guardrail_id, guardrail_version)
+    except ClientError as e:
+        print(f"Error while reading guardrail configuration: {e}")
+        guardrail = None
+    return evaluate_texts(bedrock_runtime_client, guardrail_id, texts, guardrail_version=guardrail_version,
+                          source=source, prefilter=prefilter, verdict_cache=verdict_cache if ENABLE_VERDICT_CACHE else None,
+                          max_workers=max_workers, guardrail=guardrail)
+
+# Function to stream the text of a ConverseStream answer; closing the generator closes the stream and stops the generation
+def stream_model_text(prompt, model_id=MODEL_ID, max_tokens=512):
+    response = bedrock_runtime_client.converse_stream(
+        modelId=model_id,
+        messages=[{"role": "user", "content": [{"text": prompt}]}],
+        inferenceConfig={"maxTokens": max_tokens}
+    )
+    stream = response["stream"]
+    try:
+        for event in stream:
+            if "contentBlockDelta" in event:
+                text = event["contentBlockDelta"]["delta"].get("text", "")
+                if text:
+                    yield text
+    finally:
+        stream.close()
+
+# Function to stream a model answer through the OUTPUT guardrail, printing each segment once it has passed
+def ask_model_with_output_guardrail(guardrail_name, prompt, guardrail_id=None, guardrail_version='DRAFT', model_id=MODEL_ID):
+    if not guardrail_id:
+        guardrail_id = get_guardrail_id_by_name(guardrail_name)
+        if not guardrail_id:
+            return None
+    # Segments are checked while the model keeps generating; a blocked segment stops the generation.
+    # A segment the guardrail could not check raises, so unchecked text is never shown.
+    guarded = GuardedStream(
+        stream_model_text(prompt, model_id),
+        lambda segment: ask_query(guardrail_name, segment, guardrail_id=guardrail_id, guardrail_version=guardrail_version,
+                                  source='OUTPUT', raise_errors=True)
+    )
+    try:
+        for text in guarded:
+            print(text, end="", flush=True)
+    except ClientError as e:
+        # Handle errors while streaming or checking the answer
+        print(f"\nError while streaming or checking the model answer: {e}")
+    print()
+    if guarded.blocked:
+        print(f"Answer blocked after {guarded.generated_chars} generated characters ({guarded.released_chars} shown):")
+        for reason in guarded.block_reasons:
+            print(f"  {reason}")
+    return guarded
+
 # Example usage with two queries
 # The first query contains a question that may trigger the guardrail and get blocked.
 # The second query contains a neutral question that should pass without intervention.
@@ -106,3 +189,13 @@ ask_query(guardrail_name='offensive-content-filter', query="Who is Michael Phelp
 
 # Query that is unlikely to be flagged and should pass through the guardrail
 ask_query(guardrail_name='offensive-content-filter', query="Who is Pelé?")
+
+# Batch example: structured verdicts for several texts, with aggregate counts
+verdicts = check_texts(guardrail_name='offensive-content-filter', texts=["Who is Michael Phelps?", "Who is Pelé?", "Who is Pelé?"])
+for verdict in verdicts:
+    print(verdict)
+print(summarize_verdicts(verdicts))
+print(verdict_cache.stats())
+
+# Streaming example: the answer is checked with the OUTPUT guardrail while it is generated
+ask_model_with_output_guardrail(guardrail_name='offensive-content-filter', prompt="Write a short biography of Michael Phelps.")
\ No newline at end of file
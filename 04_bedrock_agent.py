@@ -1,90 +1,100 @@
 import boto3
-import uuid
+import os
+import sys
 from botocore.exceptions import ClientError
+from bedrock_agent_session import AgentSession
+from bedrock_agent_trace import AgentTraceCollector
+from bedrock_resolver import BedrockResourceResolver
+from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, scheduled_client
 
 # Get clients
 bedrock_agent_client = boto3.client('bedrock-agent')
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
+bedrock_agent_runtime_client = scheduled_client(boto3.client('bedrock-agent-runtime', config=SCHEDULER_CLIENT_CONFIG))
+
+# Cached name -> ID lookups, so each question does not scan the agents and aliases again
+resource_resolver = BedrockResourceResolver(bedrock_agent_client=bedrock_agent_client)
+
+# Trace profiling: when enabled, invoke_agent is called with enableTrace and the trace events are turned into
+# a step timeline (model invocations, knowledge base lookups, action groups, guardrail) for each question
+ENABLE_TRACE_PROFILER = False
+TRACE_EXPORT_PREFIX = "agent_trace"  # Writes agent_trace.json and agent_trace.folded (flame graph input)
+trace_collector = AgentTraceCollector()
+
+# Return of control: with the action group configured to return control, the agent sends the function call
+# back to this script, which runs it locally (no Lambda cold start or extra hop) and returns the result
+ENABLE_RETURN_CONTROL = False
+local_action_handlers = {}
+if ENABLE_RETURN_CONTROL:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'documentation', '04_bedrock_agent'))
+    from local_function import get_wikipedia_url
+    # Keyed by the function name declared in the action group (see the Function Details JSON in 04_bedrock_agent.md)
+    local_action_handlers['wikifinder'] = get_wikipedia_url
 
 # Function to retrieve the agent ID by its name.
-def get_agent_id_by_name(client, agent_name):
+def get_agent_id_by_name(agent_name):
     try:
-        paginator = client.get_paginator('list_agents')
-        for page in paginator.paginate():
-            for agent in page.get('agentSummaries', []):
-                if agent.get('agentName') == agent_name:
-                    return agent.get('agentId')
+        agent_id = resource_resolver.agent_id(agent_name)
     except ClientError as e:
         print(f"Error while listing agents: {e}")
         return None
+    if agent_id:
+        return agent_id
     print(f"Agent with name '{agent_name}' not found.")
     return None
 
 # Function to retrieve the alias ID for a specific agent.
-def get_agent_alias_id(client, agent_id, alias_name):
+def get_agent_alias_id(agent_id, alias_name):
     try:
-        paginator = client.get_paginator('list_agent_aliases')
-        for page in paginator.paginate(agentId=agent_id):
-            for alias in page.get('agentAliasSummaries', []):
-                if alias.get('agentAliasName') == alias_name:
-                    return alias.get('agentAliasId')
+        alias_id = resource_resolver.agent_alias_id(agent_id, alias_name)
     except ClientError as e:
         print(f"Error while listing agent aliases: {e}")
         return None
+    if alias_id:
+        return alias_id
     print(f"Alias with name '{alias_name}' not found for agent '{agent_id}'.")
     return None
 
-# Function to invoke an agent with the specified parameters.
-def invoke_agent(client, agent_id, alias_id, session_id, query):
-    try:
-        response = client.invoke_agent(
-            agentId=agent_id,
-            agentAliasId=alias_id,
-            sessionId=session_id,
-            inputText=query
-        )
-        # Process the EventStream to compose the complete response
-        completion = response.get('completion')
-        if completion is None:
-            print("No response received from the agent.")
-            return None
-
-        full_response = ""
-        for event in completion:
-            if 'chunk' in event:
-                chunk = event['chunk']
-                if 'bytes' in chunk:
-                    full_response += chunk['bytes'].decode('utf-8')
-            elif 'trace' in event:
-                trace = event['trace']
-                print("Trace received:", trace)
-            else:
-                print("Unexpected event received:", event)
-        return full_response
-    except ClientError as e:
-        print(f"Error while invoking agent: {e}")
-        return None
-
-# Function to ask a question to a Bedrock agent.
-def ask_a_question(agent_name, alias_name, query):
+# Function to start a conversation with an agent alias; its questions share one session
+def start_session(agent_name, alias_name):
 
     # Retrieve IDs
-    agent_id = get_agent_id_by_name(bedrock_agent_client, agent_name)
+    agent_id = get_agent_id_by_name(agent_name)
     if not agent_id:
         print("Failed to retrieve the agent ID.")
         return None
     
-    alias_id = get_agent_alias_id(bedrock_agent_client, agent_id, alias_name)
+    alias_id = get_agent_alias_id(agent_id, alias_name)
     if not alias_id:
         print("Failed to retrieve the alias ID.")
         return None
 
-    # Generate session_id and invoke agent
-    session_id = str(uuid.uuid4())
-    response_text = invoke_agent(bedrock_agent_runtime_client, agent_id, alias_id, session_id, query)
+    return AgentSession(bedrock_agent_runtime_client, agent_id, alias_id, action_handlers=local_action_handlers)
+
+# Function to ask a question in an existing session, so the agent remembers the previous questions.
+def ask_in_session(session, query):
+    trace = trace_collector.start_invocation(query) if ENABLE_TRACE_PROFILER else None
+    try:
+        # The session keeps its own turn latencies and runs any returned control locally
+        response_text = session.ask(
+            query,
+            trace=trace,
+            on_trace=lambda trace_event: print("Trace received:", trace_event),
+            on_event=lambda event: print("Unexpected event received:", event)
+        )
+    except ClientError as e:
+        print(f"Error while invoking agent: {e}")
+        response_text = None
     print("Agent response:", response_text)
     return response_text
 
+# Function to ask a question to a Bedrock agent.
+def ask_a_question(agent_name, alias_name, query):
+    # Each question starts a new session
+    session = start_session(agent_name, alias_name)
+    if not session:
+        return None
+    return ask_in_session(session, query)
+
 # Calls to the function with different queries
 # Foundation Model Base Query
 ask_a_question(query='Who is Michael Jordan?', agent_name='notable-celebrity-agent', alias_name='develop-v1')
@@ -94,3 +104,18 @@ ask_a_question(query='Who is Alicia Torrence?', agent_name='notable-celebrity-ag
 
 # Lambda Query
 ask_a_question(query='Me entregue o link da página do Wikipedia do Pelé.', agent_name='notable-celebrity-agent', alias_name='develop-v1')
+
+# Multi-turn conversation: the follow-up question relies on the context of the first one
+celebrity_session = start_session(agent_name='notable-celebrity-agent', alias_name='develop-v1')
+if celebrity_session:
+    ask_in_session(celebrity_session, 'Who is Pelé?')
+    ask_in_session(celebrity_session, 'Give me the link to his Wikipedia page in English.')
+
+# Latency breakdown of the questions above
+if ENABLE_TRACE_PROFILER:
+    for step, step_summary in trace_collector.summarize()["steps"].items():
+        print(f"{step}: {step_summary['count']} steps, {step_summary['total_seconds']:.2f}s "
+              f"({step_summary['share_of_total'] or 0:.0%} of the total), p95 {step_summary['p95_seconds']:.2f}s, "
+              f"{step_summary['input_tokens']} input / {step_summary['output_tokens']} output tokens")
+    trace_collector.export_json(f"{TRACE_EXPORT_PREFIX}.json")
+    trace_collector.export_folded(f"{TRACE_EXPORT_PREFIX}.folded")
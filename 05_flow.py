@@ -1,8 +1,52 @@
+import time
 import boto3
 from botocore.exceptions import ClientError
+from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, scheduled_client
+from bedrock_flow_stream import FlowResponseStream, print_node_timings
+from bedrock_flow_batch import create_batch_client, load_documents, print_batch_report, run_batch
 
 # Creating a client for AWS Bedrock Agent Runtime
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
+bedrock_agent_runtime_client = scheduled_client(boto3.client('bedrock-agent-runtime', config=SCHEDULER_CLIENT_CONFIG))
+
+# Streams of the completed invocations, kept for the node timing report
+completed_flows = []
+
+# Configuration to record the time spent in each node of the flow (flowTraceEvent)
+ENABLE_FLOW_TRACE = True
+
+# JSONL file of documents ({"userInput", "orderId"} per line) to process concurrently, or None to skip the batch
+BATCH_DOCUMENTS_FILE = None  # e.g. 'documents.jsonl'
+BATCH_RESULTS_FILE = 'flow_results.jsonl'
+BATCH_CONCURRENCY = 8
+
+# Defines a function that starts a flow and returns its events as they arrive
+def stream_bedrock_flow(document, flow_id, flow_alias_id, enable_trace=ENABLE_FLOW_TRACE):
+    """
+    Invokes a flow from AWS Bedrock Agent Runtime without waiting for it to finish.
+
+    :param document: The content of the document to be processed.
+    :param flow_id: The flow identifier.
+    :param flow_alias_id: The alias identifier of the flow.
+    :param enable_trace: Request the node traces, used for the per-node timings.
+    :return: FlowResponseStream yielding (node name, document) for each output as it arrives
+    :raises ClientError: If the flow cannot be invoked
+    """
+    start_time = time.perf_counter()
+    response = bedrock_agent_runtime_client.invoke_flow(
+        flowIdentifier=flow_id,
+        flowAliasIdentifier=flow_alias_id,
+        inputs=[
+            {
+                "content": {
+                    "document": document
+                },
+                "nodeName": "FlowInputNode",
+                "nodeOutputName": "document"
+            }
+        ],
+        enableTrace=enable_trace
+    )
+    return FlowResponseStream(response.get("responseStream", []), start_time=start_time)
 
 # Defines a function that invokes a flow from AWS Bedrock Agent Runtime to process a document with a specific flow identifier.
 def invoke_bedrock_flow(document, flow_id, flow_alias_id):
@@ -12,35 +56,20 @@ def invoke_bedrock_flow(document, flow_id, flow_alias_id):
     :param document: The content of the document to be processed.
     :param flow_id: The flow identifier.
     :param flow_alias_id: The alias identifier of the flow.
-    :return: The output document if the flow is successful, otherwise returns an error message.
+    :return: The output document if the flow is successful ({node name: document} when the flow has
+             several outputs), otherwise returns an error message.
     """
     try:
-        # Sending a request to invoke the specified flow
-        response = bedrock_agent_runtime_client.invoke_flow(
-            flowIdentifier=flow_id,
-            flowAliasIdentifier=flow_alias_id,
-            inputs=[
-                {
-                    "content": {
-                        "document": document
-                    },
-                    "nodeName": "FlowInputNode",
-                    "nodeOutputName": "document"
-                }
-            ]
-        )
-
-        result = {}
-
-        # Processing the flow response and updating the results dictionary
-        for event in response.get("responseStream", []):
-            result.update(event)
+        # Reading the outputs of the flow as they arrive
+        stream = stream_bedrock_flow(document, flow_id, flow_alias_id)
+        outputs, completion_reason = stream.result()
+        completed_flows.append(stream)
 
         # Checking if the flow execution was successful
-        if result.get('flowCompletionEvent', {}).get('completionReason') == 'SUCCESS':
-            return result.get('flowOutputEvent', {}).get('content', {}).get('document', {})
+        if completion_reason == 'SUCCESS':
+            return next(iter(outputs.values())) if len(outputs) == 1 else outputs
         else:
-            return f"Flow invocation failed: {result.get('flowCompletionEvent', {}).get('completionReason', 'Unknown reason')}"
+            return f"Flow invocation failed: {completion_reason or 'Unknown reason'}"
     
     except ClientError as error:
         return f"{error}"
@@ -85,3 +114,27 @@ other_request = {
 # Invoking the flow to answer a general question
 response = invoke_bedrock_flow(other_request, flow_id=flow_id, flow_alias_id=flow_alias_id)
 print("\n\nGeneral Question Output:\n", response)
+
+# Streaming a flow: each output is printed as soon as its node finishes
+try:
+    stream = stream_bedrock_flow(other_request, flow_id=flow_id, flow_alias_id=flow_alias_id)
+    for node_name, document in stream:
+        print(f"\n\nOutput of {node_name} after {time.perf_counter() - stream.start_time:.2f}s:\n", document)
+    completed_flows.append(stream)
+except ClientError as error:
+    print(f"\n\nError while streaming the flow: {error}")
+
+# Time spent in each node (QueryInterpreter, JSONParser, ServiceSelector, knowledge base and Lambda nodes)
+if ENABLE_FLOW_TRACE:
+    for completed_stream in completed_flows:
+        print()
+        print_node_timings(completed_stream)
+
+# Processing a file of documents through the same flow alias, with bounded concurrency and throttle-aware retries
+if BATCH_DOCUMENTS_FILE:
+    # The batch retries (and counts) every attempt itself, so it uses a client without the quota scheduler's retries
+    with open(BATCH_RESULTS_FILE, "w", encoding="utf-8") as results_file:
+        batch_summary = run_batch(create_batch_client(BATCH_CONCURRENCY), flow_id, flow_alias_id,
+                                  load_documents(BATCH_DOCUMENTS_FILE), results_file, BATCH_CONCURRENCY)
+    print("\n")
+    print_batch_report(batch_summary)
@@ -0,0 +1,277 @@
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+from bedrock_agent_stream import AgentResponseStream
+from bedrock_stats import percentile
+
+# Load test of a Bedrock agent: N concurrent sessions, each asking M questions in the same conversation.
+#
+# Usage:
+#   python bedrock_agent_session.py notable-celebrity-agent develop-v1 --sessions 20 --turns 3 --concurrency 5
+#   python bedrock_agent_session.py notable-celebrity-agent develop-v1 --questions questions.txt
+#
+# The questions file has one question per line; session i asks questions i, i+1, ... (wrapping around).
+
+DEFAULT_QUESTIONS = [
+    "Who is Michael Jordan?",
+    "Who is Alicia Torrence?",
+    "Me entregue o link da página do Wikipedia do Pelé."
+]
+
+
+class AgentSession:
+    """
+    Conversation with an agent alias: keeps the resolved IDs and one sessionId, so each question
+    continues the same conversation. Records the latency of every turn in turns.
+
+    With action handlers, action groups configured to return control run in this process: ask()
+    executes the functions requested by the agent (concurrently when there are several) and sends
+    the results back in sessionState.returnControlInvocationResults, without a Lambda round trip.
+    Without handlers, the answer stops where the agent returned control: ask() prints a message and keeps
+    the returnControl event in return_control, so the caller can run the functions and send the results.
+    """
+
+    def __init__(self, client, agent_id, alias_id, session_id=None, action_handlers=None, max_handler_workers=4):
+        """
+        :param client: 'bedrock-agent-runtime' client
+        :param agent_id: Agent ID
+        :param alias_id: Agent alias ID
+        :param session_id: Session to continue, or None to start a new one
+        :param action_handlers: Optional {function name: Python function} for return-of-control action groups;
+                                each function receives the parameters of the invocation as keyword arguments
+        :param max_handler_workers: Maximum number of handlers running at the same time
+        """
+        self.client = client
+        self.agent_id = agent_id
+        self.alias_id = alias_id
+        self.session_id = session_id or str(uuid.uuid4())
+        self.action_handlers = action_handlers or {}
+        self.max_handler_workers = max_handler_workers
+        self.turns = []  # One {'turn', 'latency', 'time_to_first_chunk', 'error'} per question
+        self.return_control = None  # returnControl event of the last answer that was not handled locally
+
+    def stream(self, query, trace=None, on_trace=None, on_event=None, session_state=None):
+        """
+        Sends a question (or the results of returned control) and returns the answer as a stream of text.
+
+        :param query: Question, or None when only session_state is sent
+        :param trace: Optional InvocationTrace receiving the trace events (enables the agent trace)
+        :param on_trace: Function called with each trace event when no InvocationTrace is given
+        :param on_event: Function called with any other non-chunk event
+        :param session_state: Optional sessionState of the request
+        :return: AgentResponseStream
+        :raises ClientError: If the agent cannot be invoked
+        """
+        start_time = time.perf_counter()
+        request = {"agentId": self.agent_id, "agentAliasId": self.alias_id, "sessionId": self.session_id}
+        if query is not None:
+            request["inputText"] = query
+        if session_state is not None:
+            request["sessionState"] = session_state
+        if trace is not None:
+            request["enableTrace"] = True
+        response = self.client.invoke_agent(**request)
+        return AgentResponseStream(
+            response.get("completion", []),
+            start_time=start_time,
+            on_trace=trace.on_trace if trace is not None else on_trace,
+            on_event=on_event
+        )
+
+    def ask(self, query, trace=None, on_trace=None, on_event=None):
+        """
+        Sends a question and waits for the complete answer, running the returned control on the way.
+
+        :return: Answer text (up to the returned control when it could not be handled locally, see return_control)
+        :raises ClientError: If the agent cannot be invoked or the stream fails (EventStreamError)
+        :raises BotoCoreError: On connection errors and read timeouts
+        """
+        turn = {"turn": len(self.turns), "latency": None, "time_to_first_chunk": None, "error": None}
+        self.turns.append(turn)
+        start_time = time.perf_counter()
+        first_chunk_time = None
+        text_parts = []
+        self.return_control = None
+        try:
+            stream = self.stream(query, trace, on_trace, on_event)
+            while True:
+                text_parts.append(stream.text())
+                if first_chunk_time is None:
+                    first_chunk_time = stream.first_chunk_time
+                if stream.return_control is None:
+                    break
+                if not self.action_handlers:
+                    self.return_control = stream.return_control
+                    functions = [invocation_input.get("functionInvocationInput", {}).get("function") or
+                                 invocation_input.get("apiInvocationInput", {}).get("apiPath")
+                                 for invocation_input in stream.return_control.get("invocationInputs", [])]
+                    print(f"The agent returned control for {functions} but no action handlers are configured; "
+                          f"the answer is incomplete.")
+                    break
+                stream = self.stream(None, trace, on_trace, on_event, session_state={
+                    "invocationId": stream.return_control["invocationId"],
+                    "returnControlInvocationResults": self.run_action_handlers(stream.return_control)
+                })
+            turn["latency"] = time.perf_counter() - start_time
+            turn["time_to_first_chunk"] = first_chunk_time - start_time if first_chunk_time is not None else None
+            return "".join(text_parts)
+        except ClientError as e:
+            turn["error"] = e.response.get("Error", {}).get("Code", "ClientError")
+            raise
+        except BotoCoreError as e:
+            turn["error"] = type(e).__name__
+            raise
+        finally:
+            if trace is not None:
+                trace.finish(turn["time_to_first_chunk"])
+
+    def run_action_handlers(self, return_control):
+        """
+        :param return_control: 'returnControl' event of the agent
+        :return: List of results in the returnControlInvocationResults format, in the order of the invocations
+        """
+        invocation_inputs = return_control.get("invocationInputs", [])
+        with ThreadPoolExecutor(max_workers=self.max_handler_workers) as executor:
+            return list(executor.map(self._run_action_handler, invocation_inputs))
+
+    def _run_action_handler(self, invocation_input):
+        function_input = invocation_input.get("functionInvocationInput")
+        if function_input is None:
+            # API schema action groups are not run locally
+            api_input = invocation_input.get("apiInvocationInput", {})
+            return {"apiResult": {
+                "actionGroup": api_input.get("actionGroup"),
+                "apiPath": api_input.get("apiPath"),
+                "httpMethod": api_input.get("httpMethod"),
+                "httpStatusCode": 501,
+                "responseState": "FAILURE",
+                "responseBody": {"application/json": {"body": "API actions are not handled by this client."}}
+            }}
+
+        function_result = {"actionGroup": function_input.get("actionGroup"), "function": function_input.get("function")}
+        handler = self.action_handlers.get(function_input.get("function"))
+        if handler is None:
+            body = f"No local handler for function '{function_input.get('function')}'."
+            function_result["responseState"] = "FAILURE"
+        else:
+            parameters = {parameter["name"]: parameter.get("value") for parameter in function_input.get("parameters", [])}
+            try:
+                body = str(handler(**parameters))
+            except Exception as e:
+                # The error is returned to the agent, which can rephrase or tell the user
+                body = f"Error executing '{function_input.get('function')}': {e}"
+                function_result["responseState"] = "FAILURE"
+        function_result["responseBody"] = {"TEXT": {"body": body}}
+        return {"functionResult": function_result}
+
+
+# Function to run many sessions at the same time, each asking its questions one after the other
+def run_load_test(create_session, conversations, concurrency):
+    """
+    :param create_session: Function returning a new AgentSession
+    :param conversations: List of question lists, one per session
+    :param concurrency: Maximum number of sessions in progress at the same time
+    :return: Tuple (list of AgentSession, wall time in seconds)
+    """
+    def run_conversation(questions):
+        session = create_session()
+        for question in questions:
+            try:
+                session.ask(question)
+            except (ClientError, BotoCoreError):
+                pass  # Recorded in session.turns; the next question still runs, as a user would retry
+        return session
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sessions = list(executor.map(run_conversation, conversations))
+    return sessions, time.perf_counter() - start_time
+
+
+# Function to aggregate the turns of a load test
+def summarize_load_test(sessions, wall_time):
+    """
+    :return: Dictionary with totals, throughput and, per turn index, the latency and time-to-first-chunk
+             percentiles (later turns carry a longer conversation history, so they are reported apart)
+    """
+    turns = [turn for session in sessions for turn in session.turns]
+    errors = {}
+    by_index = {}
+    for turn in turns:
+        if turn["error"]:
+            errors[turn["error"]] = errors.get(turn["error"], 0) + 1
+        else:
+            by_index.setdefault(turn["turn"], []).append(turn)
+
+    per_turn = {}
+    for index, successful in sorted(by_index.items()):
+        latencies = [turn["latency"] for turn in successful]
+        first_chunks = [turn["time_to_first_chunk"] for turn in successful if turn["time_to_first_chunk"] is not None]
+        per_turn[index] = {
+            "count": len(successful),
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+            "p99_seconds": percentile(latencies, 99),
+            "p50_time_to_first_chunk": percentile(first_chunks, 50)
+        }
+    successful_turns = sum(len(successful) for successful in by_index.values())
+    return {
+        "sessions": len(sessions),
+        "turns": len(turns),
+        "successful_turns": successful_turns,
+        "errors": errors,
+        "wall_seconds": wall_time,
+        "turns_per_second": successful_turns / wall_time if wall_time else None,
+        "per_turn": per_turn
+    }
+
+
+# Function to print the load test report
+def print_load_report(summary):
+    def fmt(value):
+        return f"{value:.2f}" if value is not None else "n/a"
+
+    print(f"Sessions: {summary['sessions']} | turns: {summary['turns']} ({summary['successful_turns']} successful) "
+          f"| wall time: {summary['wall_seconds']:.1f}s | throughput: {fmt(summary['turns_per_second'])} turns/s")
+    if summary["errors"]:
+        print("Errors: " + ", ".join(f"{code}: {count}" for code, count in summary["errors"].items()))
+    print(f"{'turn':>4} {'count':>6} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'p50 TTFC s':>10}")
+    for index, row in summary["per_turn"].items():
+        print(f"{index + 1:>4} {row['count']:>6} {fmt(row['p50_seconds']):>7} {fmt(row['p95_seconds']):>7} "
+              f"{fmt(row['p99_seconds']):>7} {fmt(row['p50_time_to_first_chunk']):>10}")
+
+
+if __name__ == "__main__":
+    import boto3
+    from botocore.config import Config
+    from bedrock_resolver import BedrockResourceResolver
+
+    parser = argparse.ArgumentParser(description="Concurrent multi-session load test of a Bedrock agent")
+    parser.add_argument("agent_name")
+    parser.add_argument("alias_name")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of sessions (default: 10)")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per session (default: 3)")
+    parser.add_argument("--concurrency", type=int, default=5, help="Sessions in progress at the same time (default: 5)")
+    parser.add_argument("--questions", help="Text file with one question per line")
+    args = parser.parse_args()
+
+    resolver = BedrockResourceResolver(bedrock_agent_client=boto3.client('bedrock-agent'))
+    agent_id = resolver.agent_id(args.agent_name)
+    alias_id = resolver.agent_alias_id(agent_id, args.alias_name) if agent_id else None
+    if not alias_id:
+        raise SystemExit(f"Agent '{args.agent_name}' with alias '{args.alias_name}' not found.")
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as questions_file:
+            questions = [line.strip() for line in questions_file if line.strip()]
+    conversations = [[questions[(session + turn) % len(questions)] for turn in range(args.turns)]
+                     for session in range(args.sessions)]
+
+    # Client without retries or the quota scheduler, so throttling shows up in the error counts
+    runtime_client = boto3.client('bedrock-agent-runtime', config=Config(retries={"total_max_attempts": 1}))
+    load_sessions, wall_seconds = run_load_test(
+        lambda: AgentSession(runtime_client, agent_id, alias_id), conversations, args.concurrency)
+    print_load_report(summarize_load_test(load_sessions, wall_seconds))
@@ -0,0 +1,82 @@
+import codecs
+import time
+
+
+class AgentResponseStream:
+    """
+    Text of an invoke_agent completion, readable while the agent is still answering.
+
+    Chunks are decoded with an incremental UTF-8 decoder, so a multibyte character split between two
+    chunks is decoded once both halves have arrived. Iterating over the object yields the text as it
+    arrives; text() returns the complete answer, joined once. The event stream can only be read once.
+
+    When the action group of the agent returns control to the caller, the 'returnControl' event is kept
+    in return_control instead of being passed to on_event (see AgentSession in bedrock_agent_session.py).
+    """
+
+    def __init__(self, completion, start_time=None, on_trace=None, on_event=None):
+        """
+        :param completion: 'completion' EventStream of the invoke_agent response
+        :param start_time: time.perf_counter() value when the request was sent (now by default)
+        :param on_trace: Optional function called with each 'trace' event
+        :param on_event: Optional function called with any other non-chunk event
+        """
+        self.completion = completion
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.on_trace = on_trace
+        self.on_event = on_event
+        self.first_chunk_time = None
+        self.end_time = None
+        self.return_control = None
+        self._parts = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._events = None
+
+    def __iter__(self):
+        if self._events is None:
+            self._events = self._read_events()
+        return self._events
+
+    def _read_events(self):
+        for event in self.completion:
+            if "chunk" in event:
+                text = self._decoder.decode(event["chunk"].get("bytes", b""))
+                if text:
+                    if self.first_chunk_time is None:
+                        self.first_chunk_time = time.perf_counter()
+                    self._parts.append(text)
+                    yield text
+            elif "trace" in event:
+                if self.on_trace:
+                    self.on_trace(event["trace"])
+            elif "returnControl" in event:
+                self.return_control = event["returnControl"]
+            elif self.on_event:
+                self.on_event(event)
+        text = self._decoder.decode(b"", final=True)
+        if text:
+            self._parts.append(text)
+            yield text
+        self.end_time = time.perf_counter()
+
+    def text(self):
+        """
+        Reads the rest of the stream and returns the complete answer.
+        """
+        for _ in self:
+            pass
+        return "".join(self._parts)
+
+    @property
+    def time_to_first_chunk(self):
+        """
+        Seconds between the request and the first text chunk, or None before it arrives.
+        """
+        return self.first_chunk_time - self.start_time if self.first_chunk_time is not None else None
+
+    @property
+    def total_time(self):
+        """
+        Seconds between the request and the end of the stream, or None while it is still open.
+        """
+        return self.end_time - self.start_time if self.end_time is not None else None
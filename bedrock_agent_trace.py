@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+from bedrock_stats import percentile
+
+# Trace parts of an invoke_agent trace event and the phase they belong to
+TRACE_PHASES = {
+    "preProcessingTrace": "PRE_PROCESSING",
+    "orchestrationTrace": "ORCHESTRATION",
+    "postProcessingTrace": "POST_PROCESSING",
+    "routingClassifierTrace": "ROUTING_CLASSIFIER",
+    "customOrchestrationTrace": "CUSTOM_ORCHESTRATION",
+    "guardrailTrace": "GUARDRAIL",
+    "failureTrace": "FAILURE"
+}
+
+
+class TraceStep:
+    """
+    One step of an agent invocation: a model invocation, an action group or knowledge base call,
+    a guardrail assessment or a failure. Times are seconds since the invocation was sent.
+
+    Steps are timed from the arrival of their input trace to the arrival of their output trace, so
+    an action group step is the full round trip to the Lambda function (or the returned control).
+    Guardrail and failure traces have no input/output pair and are recorded with a zero duration.
+    """
+
+    __slots__ = ("phase", "step_type", "name", "trace_id", "start", "end", "input_tokens", "output_tokens")
+
+    def __init__(self, phase, step_type, name, trace_id, start, end=None):
+        self.phase = phase
+        self.step_type = step_type
+        self.name = name
+        self.trace_id = trace_id
+        self.start = start
+        self.end = end
+        self.input_tokens = None
+        self.output_tokens = None
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else None
+
+    def to_dict(self):
+        step = {name: getattr(self, name) for name in self.__slots__}
+        step["duration"] = self.duration
+        return step
+
+
+class InvocationTrace:
+    """
+    Step timeline of one invoke_agent call. Pass on_trace as the trace callback of the response stream.
+    """
+
+    def __init__(self, label=None, start_time=None):
+        """
+        :param label: Free text identifying the invocation (e.g. the question)
+        :param start_time: time.perf_counter() value when the request was sent (now by default)
+        """
+        self.label = label
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.steps = []
+        self.total_time = None
+        self.time_to_first_chunk = None
+        self._open_steps = {}  # (phase, step_type, trace_id) -> TraceStep
+
+    def _now(self):
+        return time.perf_counter() - self.start_time
+
+    def _open(self, phase, step_type, name, trace_id):
+        step = TraceStep(phase, step_type, name, trace_id, self._now())
+        self.steps.append(step)
+        self._open_steps[(phase, step_type, trace_id)] = step
+        return step
+
+    def _close(self, phase, step_type, trace_id):
+        step = self._open_steps.pop((phase, step_type, trace_id), None)
+        if step is not None:
+            step.end = self._now()
+        return step
+
+    def on_trace(self, trace_event):
+        """
+        :param trace_event: Value of the 'trace' key of an invoke_agent completion event
+        """
+        for part_key, part in trace_event.get("trace", {}).items():
+            phase = TRACE_PHASES.get(part_key, part_key)
+            if part_key == "guardrailTrace":
+                now = self._now()
+                self.steps.append(TraceStep(phase, "guardrail", part.get("action"), part.get("traceId"), now, now))
+                continue
+            if part_key == "failureTrace":
+                now = self._now()
+                self.steps.append(TraceStep(phase, "failure", part.get("failureReason"), part.get("traceId"), now, now))
+                continue
+
+            if "modelInvocationInput" in part:
+                model_input = part["modelInvocationInput"]
+                self._open(phase, "model_invocation", model_input.get("type"), model_input.get("traceId"))
+            if "modelInvocationOutput" in part:
+                model_output = part["modelInvocationOutput"]
+                step = self._close(phase, "model_invocation", model_output.get("traceId"))
+                usage = model_output.get("metadata", {}).get("usage", {})
+                if step is not None:
+                    step.input_tokens = usage.get("inputTokens")
+                    step.output_tokens = usage.get("outputTokens")
+            if "invocationInput" in part:
+                invocation_input = part["invocationInput"]
+                step_type = invocation_input.get("invocationType", "").lower()
+                self._open(phase, step_type, get_invocation_name(invocation_input), invocation_input.get("traceId"))
+            if "observation" in part:
+                observation = part["observation"]
+                self._close(phase, observation.get("type", "").lower(), observation.get("traceId"))
+
+    def finish(self, time_to_first_chunk=None):
+        """
+        Records the end of the invocation; steps still open end now.
+        """
+        self.total_time = self._now()
+        self.time_to_first_chunk = time_to_first_chunk
+        for step in self._open_steps.values():
+            step.end = self.total_time
+        self._open_steps.clear()
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "total_time": self.total_time,
+            "time_to_first_chunk": self.time_to_first_chunk,
+            "steps": [step.to_dict() for step in self.steps]
+        }
+
+
+# Function to name the target of an orchestration invocation (action group function or knowledge base)
+def get_invocation_name(invocation_input):
+    action_group = invocation_input.get("actionGroupInvocationInput")
+    if action_group:
+        target = action_group.get("function") or action_group.get("apiPath")
+        return f"{action_group.get('actionGroupName')}.{target}" if target else action_group.get("actionGroupName")
+    knowledge_base = invocation_input.get("knowledgeBaseLookupInput")
+    if knowledge_base:
+        return knowledge_base.get("knowledgeBaseId")
+    collaborator = invocation_input.get("agentCollaboratorInvocationInput")
+    if collaborator:
+        return collaborator.get("agentCollaboratorName")
+    return invocation_input.get("invocationType")
+
+
+class AgentTraceCollector:
+    """
+    Collects the step timelines of many invocations and aggregates them into latency breakdowns.
+    """
+
+    def __init__(self):
+        self.invocations = []
+        self._lock = threading.Lock()
+
+    def start_invocation(self, label=None, start_time=None):
+        invocation = InvocationTrace(label, start_time)
+        with self._lock:
+            self.invocations.append(invocation)
+        return invocation
+
+    def summarize(self):
+        """
+        :return: Dictionary with the number of invocations, their latency percentiles, and for each
+                 (phase, step type) the count, total/mean/p50/p95 seconds, share of the total time and tokens
+        """
+        with self._lock:
+            invocations = [invocation for invocation in self.invocations if invocation.total_time is not None]
+        total_time = sum(invocation.total_time for invocation in invocations)
+
+        durations = {}
+        tokens = {}
+        for invocation in invocations:
+            for step in invocation.steps:
+                key = f"{step.phase}/{step.step_type}"
+                durations.setdefault(key, []).append(step.duration or 0.0)
+                step_tokens = tokens.setdefault(key, [0, 0])
+                step_tokens[0] += step.input_tokens or 0
+                step_tokens[1] += step.output_tokens or 0
+
+        steps = {}
+        for key, values in durations.items():
+            steps[key] = {
+                "count": len(values),
+                "total_seconds": sum(values),
+                "mean_seconds": sum(values) / len(values),
+                "p50_seconds": percentile(values, 50),
+                "p95_seconds": percentile(values, 95),
+                "share_of_total": sum(values) / total_time if total_time else None,
+                "input_tokens": tokens[key][0],
+                "output_tokens": tokens[key][1]
+            }
+        latencies = [invocation.total_time for invocation in invocations]
+        first_chunks = [invocation.time_to_first_chunk for invocation in invocations if invocation.time_to_first_chunk is not None]
+        return {
+            "invocations": len(invocations),
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+            "p50_time_to_first_chunk": percentile(first_chunks, 50),
+            "steps": steps
+        }
+
+    def export_json(self, path):
+        """
+        Writes every invocation timeline and the summary to a JSON file.
+        """
+        with self._lock:
+            invocations = [invocation.to_dict() for invocation in self.invocations]
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump({"invocations": invocations, "summary": self.summarize()}, json_file, indent=2, default=str)
+
+    def export_folded(self, path):
+        """
+        Writes the steps in the folded stack format read by flame graph tools (flamegraph.pl, speedscope):
+        one 'agent;phase;step type;name milliseconds' line per stack. Time of an invocation not covered
+        by any step is reported as 'agent;other'.
+        """
+        folded = {}
+        with self._lock:
+            invocations = list(self.invocations)
+        for invocation in invocations:
+            covered = 0.0
+            for step in invocation.steps:
+                frames = ["agent", step.phase, step.step_type, str(step.name or "")]
+                stack = ";".join(frame.replace(";", ",") for frame in frames)
+                folded[stack] = folded.get(stack, 0.0) + (step.duration or 0.0)
+                covered += step.duration or 0.0
+            if invocation.total_time is not None and invocation.total_time > covered:
+                folded["agent;other"] = folded.get("agent;other", 0.0) + invocation.total_time - covered
+        with open(path, "w", encoding="utf-8") as folded_file:
+            for stack, seconds in folded.items():
+                milliseconds = round(seconds * 1000)
+                if milliseconds:
+                    folded_file.write(f"{stack.replace(' ', '_')} {milliseconds}\n")
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Default limits for the in-memory tier
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024  # 32 MB of serialized responses
+
+
+# Function to build a deterministic cache key for a model call
+def make_cache_key(model_id, api, payload):
+    """
+    Hashes the model ID, the API name and the request payload into a stable key.
+
+    The payload is serialized with sorted keys and no whitespace, so two requests that differ only
+    in the order of their parameters share the same key.
+
+    :param model_id: Bedrock model ID
+    :param api: Name of the API (e.g. 'converse', 'invoke_model')
+    :param payload: JSON-serializable request (messages or prompt plus inference parameters)
+    :return: Hex SHA-256 digest
+    """
+    canonical = json.dumps(
+        {"modelId": model_id, "api": api, "payload": payload},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for model responses.
+
+    The memory tier is an LRU bounded both by number of entries and by the size of the serialized
+    responses. The optional disk tier stores one JSON file per key under cache_dir, so cached
+    responses survive between runs. Values must be JSON-serializable. All methods are thread-safe.
+
+    Entries never expire by themselves; callers that need freshness pass max_age to get().
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        """
+        :param max_entries: Maximum number of responses kept in memory
+        :param max_bytes: Maximum total size (serialized) of the responses kept in memory
+        :param cache_dir: Directory of the persistent tier, or None to keep the cache in memory only
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # key -> (value, size in bytes, time stored)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key, max_age=None):
+        """
+        :param key: Key built with make_cache_key
+        :param max_age: Optional age in seconds above which a cached value is ignored
+        :return: The cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if max_age is None or now - entry[2] <= max_age:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+
+        value, stored_at = self._read_from_disk(key)
+        with self._lock:
+            if value is None or (max_age is not None and now - stored_at > max_age):
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store_in_memory(key, value, len(json.dumps(value)), stored_at)
+        return value
+
+    def put(self, key, value):
+        """
+        :param key: Key built with make_cache_key
+        :param value: JSON-serializable response
+        """
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._store_in_memory(key, value, len(serialized), time.time())
+        self._write_to_disk(key, serialized)
+
+    def stats(self):
+        """
+        :return: Dictionary with hit/miss counters and the current size of the memory tier
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def _store_in_memory(self, key, value, size, stored_at):
+        # Must be called with the lock held
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (value, size, stored_at)
+        self._bytes += size
+        # Evict the least recently used entries until both limits are respected
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def _disk_path(self, key):
+        # Two-character fan-out keeps directories small on large caches
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_from_disk(self, key):
+        # Returns (value, time stored); the file modification time is the time the value was stored
+        if not self.cache_dir:
+            return None, None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                return json.load(cache_file), os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_to_disk(self, key, serialized):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial response
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                cache_file.write(serialized)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing response to the disk cache: {e}")
@@ -0,0 +1,214 @@
+import argparse
+import json
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, ConnectionError, HTTPClientError
+from bedrock_flow_stream import FlowResponseStream
+from bedrock_stats import percentile
+
+# Batch processing of documents through a Bedrock flow alias.
+#
+# Usage:
+#   python bedrock_flow_batch.py YOURFLOWID YOURALIASID documents.jsonl --output flow_results.jsonl --concurrency 8
+#   python bedrock_flow_batch.py YOURFLOWID YOURALIASID documents.jsonl --unordered
+#
+# Each line of the input file is a flow input document, e.g.:
+#   {"userInput": "What is the delivery status for my order?", "orderId": "9c73e91f-8dbb-4344-95af-e850b91658b7"}
+# A line that is not valid JSON gets a result with the error 'InvalidJSON'; the other documents still run.
+# Each line of the output file is the result of one document:
+#   {"index": 0, "outputs": {"FlowOutputNode": "..."}, "completion_reason": "SUCCESS", "latency": 2.1, "attempts": 1, "error": null}
+# With --unordered, results are written as soon as they are ready instead of in input order.
+
+DEFAULT_CONCURRENCY = 8
+MAX_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+# Error codes worth retrying; errors raised while reading the event stream use lowercase codes (e.g. 'throttlingException')
+RETRYABLE_ERROR_CODES = {"throttlingexception", "toomanyrequestsexception", "servicequotaexceededexception",
+                         "serviceunavailableexception", "internalserverexception", "dependencyfailedexception"}
+
+
+class InvalidDocument:
+    """
+    Line of the input file that could not be parsed; run_document reports it as an error result.
+    """
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = message
+
+
+# Function to read the documents of a JSONL file one at a time
+def load_documents(path):
+    with open(path, encoding="utf-8") as documents_file:
+        for line_number, line in enumerate(documents_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield InvalidDocument(line_number, str(e))
+
+
+# Function to create the client of a batch
+def create_batch_client(concurrency=DEFAULT_CONCURRENCY):
+    """
+    botocore retries are disabled and the client is not wrapped with scheduled_client, because
+    run_document retries throttled and transient failures itself and reports the attempts it made.
+
+    :param concurrency: Flow invocations in progress at the same time (one connection each)
+    :return: 'bedrock-agent-runtime' client
+    """
+    import boto3
+    return boto3.client('bedrock-agent-runtime',
+                        config=Config(retries={"total_max_attempts": 1}, max_pool_connections=max(10, concurrency)))
+
+
+# Function to send one document through the flow, retrying throttled and transient failures
+def run_document(client, flow_id, flow_alias_id, index, document):
+    """
+    :param client: 'bedrock-agent-runtime' client without retries of its own (see create_batch_client)
+    :param index: Position of the document in the input
+    :param document: Flow input document (or InvalidDocument)
+    :return: Result dictionary with outputs, completion reason, latency, attempts and error code
+    """
+    result = {"index": index, "outputs": None, "completion_reason": None, "latency": None, "attempts": 0, "error": None}
+    if isinstance(document, InvalidDocument):
+        print(f"Error reading document {index} (line {document.line_number}): {document.message}")
+        result["error"] = "InvalidJSON"
+        return result
+    for attempt in range(MAX_ATTEMPTS):
+        result["attempts"] = attempt + 1
+        start_time = time.perf_counter()
+        try:
+            response = client.invoke_flow(
+                flowIdentifier=flow_id,
+                flowAliasIdentifier=flow_alias_id,
+                inputs=[{"content": {"document": document}, "nodeName": "FlowInputNode", "nodeOutputName": "document"}]
+            )
+            # Throttling can also be reported inside the event stream, so the whole stream is read before returning
+            outputs, completion_reason = FlowResponseStream(response.get("responseStream", []), start_time).result()
+            result.update(outputs=outputs, completion_reason=completion_reason,
+                          latency=time.perf_counter() - start_time, error=None)
+            return result
+        except (ClientError, BotoCoreError) as e:
+            if isinstance(e, ClientError):
+                result["error"] = e.response.get("Error", {}).get("Code", "ClientError")
+                retryable = result["error"].lower() in RETRYABLE_ERROR_CODES
+            else:
+                # Connection failures and read timeouts are transient; other client-side errors are not
+                result["error"] = type(e).__name__
+                retryable = isinstance(e, (ConnectionError, HTTPClientError))
+            if not retryable or attempt == MAX_ATTEMPTS - 1:
+                return result
+            # Exponential backoff with full jitter, so the workers do not retry in lockstep
+            time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)))
+        except Exception as e:
+            # An unexpected failure (e.g. a malformed event) ends this document, not the batch
+            print(f"Error running document {index}: {e}")
+            result["error"] = type(e).__name__
+            return result
+    return result
+
+
+# Function to run many documents through the flow with bounded concurrency, writing each result as a JSON line
+def run_batch(client, flow_id, flow_alias_id, documents, output_file, concurrency=DEFAULT_CONCURRENCY, ordered=True):
+    """
+    :param documents: Iterable of flow input documents (read lazily, so it can be larger than memory)
+    :param output_file: Text file receiving one JSON result per line
+    :param concurrency: Maximum number of flow invocations in progress at the same time
+    :param ordered: Write results in input order (a slow document holds back the ones after it) or as they finish
+    :return: Summary dictionary (see summarize_batch)
+    """
+    results = []  # Results without outputs, kept for the summary
+    max_pending = concurrency * 2  # Documents read ahead of the workers
+
+    def write(future):
+        result = future.result()
+        output_file.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        results.append({key: value for key, value in result.items() if key != "outputs"})
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque() if ordered else set()
+        for index, document in enumerate(documents):
+            future = executor.submit(run_document, client, flow_id, flow_alias_id, index, document)
+            if ordered:
+                pending.append(future)
+                while len(pending) >= max_pending or (pending and pending[0].done()):
+                    write(pending.popleft())
+            else:
+                pending.add(future)
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for done_future in done:
+                        write(done_future)
+        for future in (pending if ordered else as_completed(pending)):
+            write(future)
+    return summarize_batch(results, time.perf_counter() - start_time)
+
+
+# Function to aggregate the results of a batch
+def summarize_batch(results, wall_time):
+    """
+    :return: Dictionary with totals, throughput, counts by completion reason and by error code, retries
+             and latency percentiles of the completed invocations
+    """
+    completion_reasons = {}
+    errors = {}
+    latencies = []
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+        else:
+            reason = result["completion_reason"] or "NO_COMPLETION_EVENT"
+            completion_reasons[reason] = completion_reasons.get(reason, 0) + 1
+            latencies.append(result["latency"])
+    succeeded = completion_reasons.get("SUCCESS", 0)
+    return {
+        "documents": len(results),
+        "succeeded": succeeded,
+        "completion_reasons": completion_reasons,
+        "errors": errors,
+        "retries": sum(result["attempts"] - 1 for result in results if result["attempts"]),
+        "wall_seconds": wall_time,
+        "documents_per_second": len(results) / wall_time if wall_time else None,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "p99_seconds": percentile(latencies, 99)
+    }
+
+
+# Function to print the batch report
+def print_batch_report(summary):
+    def fmt(value):
+        return f"{value:.2f}" if value is not None else "n/a"
+
+    print(f"Documents: {summary['documents']} ({summary['succeeded']} succeeded, {summary['retries']} retries) "
+          f"| wall time: {summary['wall_seconds']:.1f}s | throughput: {fmt(summary['documents_per_second'])} documents/s")
+    print("Completion reasons: " + (", ".join(f"{reason}: {count}" for reason, count in summary["completion_reasons"].items()) or "none"))
+    if summary["errors"]:
+        print("Errors: " + ", ".join(f"{code}: {count}" for code, count in summary["errors"].items()))
+    print(f"Latency p50: {fmt(summary['p50_seconds'])}s | p95: {fmt(summary['p95_seconds'])}s | p99: {fmt(summary['p99_seconds'])}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the documents of a JSONL file through a Bedrock flow alias")
+    parser.add_argument("flow_id")
+    parser.add_argument("flow_alias_id")
+    parser.add_argument("documents", help="JSONL file with one flow input document per line")
+    parser.add_argument("--output", default="flow_results.jsonl", help="JSONL file receiving the results (default: flow_results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Flow invocations in progress at the same time (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--unordered", action="store_true", help="Write results as soon as they are ready")
+    args = parser.parse_args()
+
+    # Every attempt is made (and counted) by run_document, so the client does not retry
+    runtime_client = create_batch_client(args.concurrency)
+    with open(args.output, "w", encoding="utf-8") as results_file:
+        batch_summary = run_batch(runtime_client, args.flow_id, args.flow_alias_id, load_documents(args.documents),
+                                  results_file, args.concurrency, ordered=not args.unordered)
+    print_batch_report(batch_summary)
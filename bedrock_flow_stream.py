@@ -0,0 +1,156 @@
+import time
+
+# Trace parts of a flowTraceEvent that mark the end of a node (a condition node reports its result instead of an output)
+NODE_END_TRACES = ("nodeOutputTrace", "conditionNodeResultTrace")
+
+
+class NodeTiming:
+    """
+    Execution of one flow node, from its input trace to its output (or condition result) trace.
+
+    input_time and output_time are the timestamps reported by the service; input_arrival and
+    output_arrival are the seconds since the request was sent when the traces reached this process.
+    actions are the service calls the node made (e.g. Lambda Invoke, Bedrock Retrieve).
+    """
+
+    __slots__ = ("node_name", "input_time", "output_time", "input_arrival", "output_arrival", "actions")
+
+    def __init__(self, node_name):
+        self.node_name = node_name
+        self.input_time = None
+        self.output_time = None
+        self.input_arrival = None
+        self.output_arrival = None
+        self.actions = []
+
+    @property
+    def duration(self):
+        """
+        Seconds spent in the node, from the service timestamps when both are known.
+        """
+        if self.input_time is not None and self.output_time is not None:
+            return (self.output_time - self.input_time).total_seconds()
+        if self.input_arrival is not None and self.output_arrival is not None:
+            return self.output_arrival - self.input_arrival
+        return None
+
+    def to_dict(self):
+        timing = {name: getattr(self, name) for name in self.__slots__}
+        timing["duration"] = self.duration
+        return timing
+
+
+class FlowResponseStream:
+    """
+    Events of an invoke_flow response, readable while the flow is still running.
+
+    Iterating over the object yields a (node name, document) pair for each flowOutputEvent as soon as
+    it arrives, so a flow with several output nodes returns all of them. With enableTrace, the
+    flowTraceEvents are turned into NodeTiming records in node_timings. When the stream ends,
+    completion_reason holds the reason of the flowCompletionEvent ('SUCCESS', 'INPUT_REQUIRED', ...).
+    The event stream can only be read once.
+    """
+
+    def __init__(self, response_stream, start_time=None, on_event=None):
+        """
+        :param response_stream: 'responseStream' EventStream of the invoke_flow response
+        :param start_time: time.perf_counter() value when the request was sent (now by default)
+        :param on_event: Optional function called with any other event (e.g. flowMultiTurnInputRequestEvent)
+        """
+        self.response_stream = response_stream
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.on_event = on_event
+        self.outputs = {}  # Node name -> document
+        self.node_timings = []
+        self.completion_reason = None
+        self.first_output_time = None
+        self.end_time = None
+        self._open_nodes = {}  # Node name -> NodeTiming waiting for its output trace
+        self._events = None
+
+    def __iter__(self):
+        if self._events is None:
+            self._events = self._read_events()
+        return self._events
+
+    def _read_events(self):
+        for event in self.response_stream:
+            if "flowOutputEvent" in event:
+                output = event["flowOutputEvent"]
+                if self.first_output_time is None:
+                    self.first_output_time = time.perf_counter()
+                document = output.get("content", {}).get("document")
+                self.outputs[output.get("nodeName")] = document
+                yield output.get("nodeName"), document
+            elif "flowTraceEvent" in event:
+                self._on_trace(event["flowTraceEvent"].get("trace", {}))
+            elif "flowCompletionEvent" in event:
+                self.completion_reason = event["flowCompletionEvent"].get("completionReason")
+            elif self.on_event:
+                self.on_event(event)
+        self.end_time = time.perf_counter()
+        return self.completion_reason
+
+    def _on_trace(self, trace):
+        arrival = time.perf_counter() - self.start_time
+        if "nodeInputTrace" in trace:
+            node_trace = trace["nodeInputTrace"]
+            timing = NodeTiming(node_trace.get("nodeName"))
+            timing.input_time = node_trace.get("timestamp")
+            timing.input_arrival = arrival
+            self.node_timings.append(timing)
+            self._open_nodes[timing.node_name] = timing
+        for part_key in NODE_END_TRACES:
+            if part_key in trace:
+                node_trace = trace[part_key]
+                timing = self._open_nodes.pop(node_trace.get("nodeName"), None)
+                if timing is None:
+                    # Nodes without inputs (the flow input node) only report their output
+                    timing = NodeTiming(node_trace.get("nodeName"))
+                    self.node_timings.append(timing)
+                timing.output_time = node_trace.get("timestamp")
+                timing.output_arrival = arrival
+        if "nodeActionTrace" in trace:
+            node_trace = trace["nodeActionTrace"]
+            timing = self._open_nodes.get(node_trace.get("nodeName"))
+            if timing is not None:
+                timing.actions.append(f"{node_trace.get('serviceName')}.{node_trace.get('operationName')}")
+
+    def result(self):
+        """
+        Reads the rest of the stream.
+
+        :return: Tuple (dictionary {node name: document}, completion reason)
+        """
+        for _ in self:
+            pass
+        return self.outputs, self.completion_reason
+
+    @property
+    def time_to_first_output(self):
+        """
+        Seconds between the request and the first output, or None before it arrives.
+        """
+        return self.first_output_time - self.start_time if self.first_output_time is not None else None
+
+    @property
+    def total_time(self):
+        """
+        Seconds between the request and the end of the stream, or None while it is still open.
+        """
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+
+# Function to print the node timings of a flow invocation, slowest node first
+def print_node_timings(stream):
+    def fmt(value):
+        return f"{value:.3f}" if value is not None else "n/a"
+
+    timings = sorted(stream.node_timings, key=lambda timing: timing.duration or 0.0, reverse=True)
+    total_time = stream.total_time
+    print(f"{'node':<24} {'seconds':>8} {'share':>6}  actions")
+    for timing in timings:
+        share = f"{timing.duration / total_time:.0%}" if timing.duration is not None and total_time else "n/a"
+        print(f"{str(timing.node_name):<24} {fmt(timing.duration):>8} {share:>6}  {', '.join(timing.actions)}")
+    print(f"Total: {fmt(total_time)}s | first output: {fmt(stream.time_to_first_output)}s "
+          f"| completion: {stream.completion_reason}")
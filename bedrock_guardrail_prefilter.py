@@ -0,0 +1,234 @@
+import re
+from collections import deque
+from bedrock_guardrail_verdicts import MODEL_BASED_POLICIES, Finding, format_block_reason
+
+# Local patterns for the PII entity types that have a recognizable format. The service detects PII with a
+# model, so a local match can block a text, but a text without local matches still goes to apply_guardrail.
+# Other types (names, addresses, ...) are only detected by the service.
+PII_PATTERNS = {
+    "EMAIL": r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+    # Separators are required and the number must stand alone, so IDs and timestamps made of digits do not match
+    "PHONE": r"(?<![\w-])(?:\+?1[ .-]?)?(?:\(\d{3}\)[ .-]?|\d{3}[ .-])\d{3}[ .-]\d{4}(?![\w-])",
+    "US_SOCIAL_SECURITY_NUMBER": r"\b\d{3}-\d{2}-\d{4}\b",
+    "CREDIT_DEBIT_CARD_NUMBER": r"(?<![\w-])(?:\d[ -]?){12,18}\d(?![\w-])",  # Also checked with luhn_valid
+    "IP_ADDRESS": r"\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b",
+    "URL": r"\bhttps?://[^\s]+",
+    "AWS_ACCESS_KEY": r"\b(?:AKIA|ASIA)[A-Z0-9]{16}\b"
+}
+
+
+# Function to check the Luhn checksum of a card number, which rules out most digit runs that are not cards
+def luhn_valid(number):
+    digits = [int(char) for char in number if char.isdigit()]
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        if position % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return total % 10 == 0
+
+
+# Checks applied to a PII match after the regex, by entity type
+PII_VALIDATORS = {
+    "CREDIT_DEBIT_CARD_NUMBER": luhn_valid
+}
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: finds every occurrence of any of the patterns in a single pass over the text.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: Iterable of non-empty strings
+        """
+        self.goto = [{}]  # One transition dictionary per trie node
+        self.fail = [0]
+        self.outputs = [[]]  # Patterns ending at each node (including those reached through fail links)
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_fail_links()
+
+    def _add(self, pattern):
+        node = 0
+        for character in pattern:
+            next_node = self.goto[node].get(character)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][character] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append(pattern)
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for character, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(character, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def finditer(self, text):
+        """
+        :param text: Text to scan
+        :return: Generator of (start, end, pattern) for every occurrence
+        """
+        node = 0
+        for position, character in enumerate(text):
+            while node and character not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(character, 0)
+            for pattern in self.outputs[node]:
+                yield position - len(pattern) + 1, position + 1, pattern
+
+
+class GuardrailPrefilter:
+    """
+    Local evaluation of the deterministic policies of a guardrail (custom words, managed word lists
+    provided by the caller, regexes and recognizable PII entities).
+
+    evaluate() returns the block reasons when a blocking rule matches, an empty list when the text passes
+    and the guardrail has nothing else to check, and None when only the service can decide. Local PII
+    patterns can only block: a guardrail with PII entities always leaves passing texts to the service.
+    """
+
+    def __init__(self, guardrail, managed_word_lists=None):
+        """
+        :param guardrail: Response of the bedrock get_guardrail API
+        :param managed_word_lists: Optional {list_type: [words]} for the managed lists (e.g. PROFANITY),
+                                   whose contents are not returned by get_guardrail
+        """
+        managed_word_lists = managed_word_lists or {}
+        # With a model-based policy, a text without local matches is undecided
+        self.fully_local = not any(guardrail.get(policy) for policy in MODEL_BASED_POLICIES)
+
+        # Custom words and managed lists share one automaton; each word remembers how to report it
+        word_policy = guardrail.get("wordPolicy", {})
+        self._word_labels = {}
+        for word in word_policy.get("words", []):
+            self._word_labels[word["text"].lower()] = ("custom", None, word)
+        for managed_list in word_policy.get("managedWordLists", []):
+            list_type = managed_list.get("type")
+            if list_type not in managed_word_lists:
+                self.fully_local = False  # The list contents are only known by the service
+                continue
+            for word in managed_word_lists[list_type]:
+                self._word_labels.setdefault(word.lower(), ("managed", list_type, managed_list))
+        self._automaton = AhoCorasick(self._word_labels)
+
+        # Regexes and PII entities are compiled into one combined regex per source (INPUT / OUTPUT)
+        sensitive_policy = guardrail.get("sensitiveInformationPolicy", {})
+        rules = []  # (kind, name, pattern, rule)
+        for entity in sensitive_policy.get("piiEntities", []):
+            pattern = PII_PATTERNS.get(entity.get("type"))
+            if pattern is not None:
+                rules.append(("pii", entity["type"], pattern, entity))
+        if sensitive_policy.get("piiEntities"):
+            # PII detection in the service is model-based: a local match can block, but never clear a text
+            self.fully_local = False
+        for regex in sensitive_policy.get("regexes", []):
+            rules.append(("regex", regex.get("name"), regex.get("pattern"), regex))
+
+        self._rule_labels = {}  # Group name -> (kind, name)
+        self._regexes = {}  # Source -> list of compiled regexes (normally a single combined one)
+        self._source_fully_local = {}
+        for source in ("INPUT", "OUTPUT"):
+            self._regexes[source], self._source_fully_local[source] = self._compile_rules(rules, source)
+
+    @staticmethod
+    def _get_action(rule, source):
+        action_key = "inputAction" if source == "INPUT" else "outputAction"
+        return rule.get(action_key, rule.get("action", "BLOCK"))
+
+    def _is_blocking(self, rule, source):
+        return self._get_action(rule, source) in ("BLOCK", "BLOCKED")
+
+    def _compile_rules(self, rules, source):
+        """
+        :return: Tuple (compiled regexes, whether every rule of the source could be handled locally)
+        """
+        fully_local = True
+        parts = []
+        for index, (kind, name, pattern, rule) in enumerate(rules):
+            if not self._is_blocking(rule, source):
+                # Anonymized entities change the text returned by the service, so they cannot be decided locally
+                fully_local = fully_local and self._get_action(rule, source) == "NONE"
+                continue
+            try:
+                re.compile(pattern)
+            except re.error:
+                fully_local = False  # Not a Python-compatible pattern; left to the service
+                continue
+            group_name = f"rule{index}"
+            self._rule_labels[group_name] = (kind, name)
+            parts.append((group_name, pattern))
+
+        if not parts:
+            return [], fully_local
+        try:
+            return [re.compile("|".join(f"(?P<{group_name}>{pattern})" for group_name, pattern in parts))], fully_local
+        except re.error:
+            # Patterns with their own (duplicated) group names cannot be combined; compile them one by one
+            return [re.compile(f"(?P<{group_name}>{pattern})") for group_name, pattern in parts], fully_local
+
+    def find_matches(self, text, source="INPUT"):
+        """
+        :param text: Text to check
+        :param source: 'INPUT' or 'OUTPUT'
+        :return: List of Finding records for the blocking rules that matched
+        """
+        findings = []
+        lowered = text.lower()
+        reported = set()
+        for start, end, word in self._automaton.finditer(lowered):
+            # Words only match on word boundaries, as in the service
+            if (start > 0 and lowered[start - 1].isalnum()) or (end < len(lowered) and lowered[end].isalnum()):
+                continue
+            kind, list_type, rule = self._word_labels[word]
+            if word in reported or not self._is_blocking(rule, source):
+                continue
+            reported.add(word)
+            if kind == "custom":
+                findings.append(Finding("wordPolicy", "customWords", "CUSTOM_WORD", "BLOCKED", match=text[start:end]))
+            else:
+                findings.append(Finding("wordPolicy", "managedWordLists", list_type, "BLOCKED", match=text[start:end]))
+
+        for regex in self._regexes[source]:
+            for match in regex.finditer(text):
+                # The first of our groups that took part in the match identifies the rule
+                group_name = next(name for name in regex.groupindex if name in self._rule_labels and match.group(name) is not None)
+                kind, name = self._rule_labels[group_name]
+                if (kind, name) in reported:
+                    continue
+                if kind == "pii" and name in PII_VALIDATORS and not PII_VALIDATORS[name](match.group()):
+                    continue
+                reported.add((kind, name))
+                category = "piiEntities" if kind == "pii" else "regexes"
+                findings.append(Finding("sensitiveInformationPolicy", category, name, "BLOCKED", match=match.group()))
+        return findings
+
+    def check(self, text, source="INPUT"):
+        """
+        :param text: Text to check
+        :param source: 'INPUT' or 'OUTPUT'
+        :return: Findings if a rule matched, [] if the text passes every policy of the guardrail,
+                 or None if the service still has to evaluate it
+        """
+        findings = self.find_matches(text, source)
+        if findings:
+            return findings
+        return [] if self.fully_local and self._source_fully_local[source] else None
+
+    def evaluate(self, text, source="INPUT"):
+        """
+        Same as check(), with the findings formatted as block reasons.
+        """
+        findings = self.check(text, source)
+        return None if findings is None else [format_block_reason(finding) for finding in findings]
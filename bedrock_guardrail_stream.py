@@ -0,0 +1,139 @@
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Segments are cut at the last sentence end once MIN_SEGMENT_CHARS are buffered, or at
+# MAX_SEGMENT_CHARS when no sentence ends. Each check also covers the last OVERLAP_CHARS of the
+# previous segment, so a word, regex or PII entity split across two segments is still seen whole.
+MIN_SEGMENT_CHARS = 200
+MAX_SEGMENT_CHARS = 1000
+OVERLAP_CHARS = 100
+DEFAULT_MAX_WORKERS = 4
+
+SENTENCE_END = re.compile(r"[.!?]\s|\n")
+
+
+# Function to find where the buffered text can be cut into a segment
+def find_segment_end(buffer, min_chars=MIN_SEGMENT_CHARS, max_chars=MAX_SEGMENT_CHARS):
+    """
+    :param buffer: Text waiting to be checked
+    :return: Length of the next segment, or None if more text is needed
+    """
+    if len(buffer) < min_chars:
+        return None
+    end = None
+    for match in SENTENCE_END.finditer(buffer, min_chars - 1, max_chars):
+        end = match.end()
+    if end is None and len(buffer) >= max_chars:
+        # No sentence end in the window: cut after the last space, or in the middle of a word as a last resort
+        space = buffer.rfind(" ", min_chars, max_chars)
+        end = space + 1 if space != -1 else max_chars
+    return end
+
+
+class GuardedStream:
+    """
+    Applies an OUTPUT guardrail to a stream of generated text while it is being generated.
+
+    The text is cut into segments (see find_segment_end) and each segment is checked on a thread pool
+    as soon as it is complete, so moderation runs while the model keeps generating. Iterating over the
+    object yields the text of each segment once it has passed. When a segment is blocked the upstream
+    stream is closed, which stops the generation, and iteration ends; the block reasons are then in
+    block_reasons. A blocked segment stops the stream as soon as its check finishes, even while
+    earlier segments are still being checked (they are then not released). When a check fails, its
+    exception is raised by the iteration: a segment that could not be checked is never released.
+
+    Usage:
+        guarded = GuardedStream(text_chunks, lambda segment: ask_query(..., query=segment, source='OUTPUT'))
+        for text in guarded:
+            print(text, end="")
+        if guarded.blocked:
+            print(guarded.block_reasons)
+    """
+
+    def __init__(self, text_chunks, check_segment, min_segment_chars=MIN_SEGMENT_CHARS,
+                 max_segment_chars=MAX_SEGMENT_CHARS, overlap_chars=OVERLAP_CHARS, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        :param text_chunks: Iterator of generated text chunks (closed with close() when a segment is blocked)
+        :param check_segment: Function returning the block reasons of a text (empty when it passes); it must
+                              raise, not return an empty list, when the text could not be checked
+        :param min_segment_chars: Minimum size of a segment cut at a sentence end
+        :param max_segment_chars: Maximum size of a segment
+        :param overlap_chars: Characters of the previous segment repeated in the next check
+        :param max_workers: Number of checks in flight
+        """
+        self.text_chunks = text_chunks
+        self.check_segment = check_segment
+        self.min_segment_chars = min_segment_chars
+        self.max_segment_chars = max_segment_chars
+        self.overlap_chars = overlap_chars
+        self.max_workers = max_workers
+        self.blocked = False
+        self.block_reasons = []
+        self.segments_checked = 0
+        self.generated_chars = 0
+        self.released_chars = 0
+
+    def __iter__(self):
+        pending = deque()  # (segment, future) in generation order
+        buffer = ""
+        tail = ""  # End of the previous segment, repeated in the next check
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for chunk in self.text_chunks:
+                    self.generated_chars += len(chunk)
+                    buffer += chunk
+                    end = find_segment_end(buffer, self.min_segment_chars, self.max_segment_chars)
+                    while end:
+                        segment, buffer = buffer[:end], buffer[end:]
+                        pending.append((segment, executor.submit(self.check_segment, tail + segment)))
+                        tail = segment[-self.overlap_chars:] if self.overlap_chars else ""
+                        end = find_segment_end(buffer, self.min_segment_chars, self.max_segment_chars)
+
+                    # Release the segments already approved, without waiting for the others
+                    while pending and pending[0][1].done():
+                        segment, future = pending.popleft()
+                        if not self._release(segment, future):
+                            return
+                        yield segment
+
+                    # A later segment already blocked stops the generation without waiting for the earlier checks
+                    for _, future in pending:
+                        if future.done() and future.result():
+                            self.segments_checked += 1
+                            self.blocked = True
+                            self.block_reasons = future.result()
+                            return
+
+                if buffer:
+                    pending.append((buffer, executor.submit(self.check_segment, tail + buffer)))
+
+                # The generation has ended: wait for the remaining checks in order
+                while pending:
+                    segment, future = pending.popleft()
+                    if not self._release(segment, future):
+                        return
+                    yield segment
+            finally:
+                for _, future in pending:
+                    future.cancel()
+                close = getattr(self.text_chunks, "close", None)
+                if close:
+                    close()
+
+    def _release(self, segment, future):
+        # Returns True when the segment passed the guardrail
+        block_reasons = future.result()
+        self.segments_checked += 1
+        if block_reasons:
+            self.blocked = True
+            self.block_reasons = block_reasons
+            return False
+        self.released_chars += len(segment)
+        return True
+
+    def text(self):
+        """
+        Consumes the stream and returns the approved text (the segments released before the block).
+        """
+        return "".join(self)
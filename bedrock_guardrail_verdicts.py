@@ -0,0 +1,361 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from bedrock_cache import ResponseCache
+
+# Limits of one apply_guardrail request built by evaluate_texts. Texts longer than
+# MAX_CHARACTERS_PER_REQUEST are sent alone. Adjust to the quotas of your account.
+MAX_BLOCKS_PER_REQUEST = 25
+MAX_CHARACTERS_PER_REQUEST = 25000
+DEFAULT_MAX_WORKERS = 8
+
+# The DRAFT version of a guardrail can be edited at any time: its verdicts are reused for at most
+# DRAFT_TTL_SECONDS, and its updatedAt is checked at most every DRAFT_CHECK_INTERVAL_SECONDS
+DRAFT_VERSION = "DRAFT"
+DRAFT_TTL_SECONDS = 300
+DRAFT_CHECK_INTERVAL_SECONDS = 30
+
+# Policies evaluated by models in the service; PII entities (in sensitiveInformationPolicy) are detected by a model too
+MODEL_BASED_POLICIES = ("topicPolicy", "contentPolicy", "contextualGroundingPolicy")
+
+# Items of each policy in an assessment: (policy, list key, key holding the type of the item)
+ASSESSMENT_ITEMS = [
+    ("topicPolicy", "topics", "name"),
+    ("contentPolicy", "filters", "type"),
+    ("wordPolicy", "customWords", None),
+    ("wordPolicy", "managedWordLists", "type"),
+    ("sensitiveInformationPolicy", "piiEntities", "type"),
+    ("sensitiveInformationPolicy", "regexes", "name"),
+    ("contextualGroundingPolicy", "filters", "type")
+]
+
+
+class Finding:
+    """
+    One item of a guardrail assessment (a topic, filter, word, PII entity or regex that was detected).
+    """
+
+    __slots__ = ("policy", "category", "type", "action", "confidence", "score", "threshold", "match")
+
+    def __init__(self, policy, category, type, action, confidence=None, score=None, threshold=None, match=None):
+        """
+        :param policy: Assessment policy (e.g. 'contentPolicy')
+        :param category: List of the policy holding the item (e.g. 'filters', 'customWords', 'regexes')
+        :param type: Topic name, filter type, managed list type, PII type or regex name ('CUSTOM_WORD' for custom words)
+        :param action: Action reported by the service (e.g. 'BLOCKED', 'ANONYMIZED', 'NONE')
+        """
+        self.policy = policy
+        self.category = category
+        self.type = type
+        self.action = action
+        self.confidence = confidence
+        self.score = score
+        self.threshold = threshold
+        self.match = match
+
+    def __repr__(self):
+        return f"Finding({self.policy}/{self.category}, {self.type!r}, {self.action})"
+
+
+class Verdict:
+    """
+    Result of the guardrail for one text.
+
+    origin is 'service' when apply_guardrail decided, 'local' when the pre-filter did and
+    'cache' when the verdict was reused from a GuardrailVerdictCache.
+    """
+
+    __slots__ = ("index", "action", "findings", "origin", "error")
+
+    def __init__(self, index, action, findings=(), origin="service", error=None):
+        self.index = index
+        self.action = action
+        self.findings = tuple(findings)
+        self.origin = origin
+        self.error = error
+
+    @property
+    def blocked(self):
+        return any(finding.action == "BLOCKED" for finding in self.findings)
+
+    def __repr__(self):
+        return f"Verdict(index={self.index}, action={self.action}, findings={list(self.findings)}, origin={self.origin})"
+
+
+# Function to convert the assessments of an apply_guardrail response into Finding records
+def parse_assessments(assessments):
+    findings = []
+    for assessment in assessments:
+        for policy, category, type_key in ASSESSMENT_ITEMS:
+            for item in assessment.get(policy, {}).get(category, []):
+                findings.append(Finding(
+                    policy, category,
+                    item.get(type_key) if type_key else "CUSTOM_WORD",
+                    item.get("action"),
+                    confidence=item.get("confidence"),
+                    score=item.get("score"),
+                    threshold=item.get("threshold"),
+                    match=item.get("match")
+                ))
+    return findings
+
+
+# Function to describe a blocked finding with the messages printed by the scripts
+def format_block_reason(finding):
+    if finding.policy == "topicPolicy":
+        return f"Topic '{finding.type}' was blocked."
+    if finding.policy == "contentPolicy":
+        return f"Content filter '{finding.type}' was blocked with confidence '{finding.confidence}'."
+    if finding.category == "customWords":
+        return f"Custom word '{finding.match}' was blocked."
+    if finding.category == "managedWordLists":
+        return f"Managed word '{finding.match}' of type '{finding.type}' was blocked."
+    if finding.category == "piiEntities":
+        return f"PII entity '{finding.type}' was blocked."
+    if finding.category == "regexes":
+        return f"Regex '{finding.type}' matched and was blocked."
+    return (f"Contextual grounding filter '{finding.type}' was blocked with score '{finding.score}' "
+            f"and threshold '{finding.threshold}'.")
+
+
+# Function to check whether a guardrail only has deterministic policies (words and regexes)
+def has_only_deterministic_policies(guardrail):
+    """
+    :param guardrail: Response of the bedrock get_guardrail API, or None if unknown
+    :return: True if every policy gives each text the same result whatever the other texts of the request
+    """
+    if not guardrail or any(guardrail.get(policy) for policy in MODEL_BASED_POLICIES):
+        return False
+    return not guardrail.get("sensitiveInformationPolicy", {}).get("piiEntities")
+
+
+# Function to normalize a text before hashing it, so formatting-only differences share a cache entry
+def normalize_content(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class GuardrailVerdictCache:
+    """
+    Cache of guardrail results keyed by (guardrail ID, version, source, hash of the normalized content).
+
+    Numbered versions cannot change, so their results are kept until evicted. Results of the DRAFT
+    version expire after draft_ttl; when a bedrock client is given, the updatedAt of the DRAFT is also
+    part of the key, so editing the guardrail invalidates its cached results at the next check.
+    Storage is a ResponseCache (LRU in memory, optional directory for a persistent tier).
+    """
+
+    def __init__(self, bedrock_client=None, cache_dir=None, max_entries=10000,
+                 draft_ttl=DRAFT_TTL_SECONDS, draft_check_interval=DRAFT_CHECK_INTERVAL_SECONDS):
+        """
+        :param bedrock_client: Optional 'bedrock' client, used to read guardrail configurations (get_guardrail)
+        :param cache_dir: Directory of the persistent tier, or None to keep the cache in memory only
+        :param max_entries: Maximum number of results kept in memory
+        :param draft_ttl: Time in seconds a DRAFT result can be reused
+        :param draft_check_interval: Minimum time in seconds between two get_guardrail calls for a DRAFT
+        """
+        self.bedrock_client = bedrock_client
+        self.draft_ttl = draft_ttl
+        self.draft_check_interval = draft_check_interval
+        self.cache = ResponseCache(max_entries=max_entries, cache_dir=cache_dir)
+        self._guardrails = {}  # (guardrail_id, version) -> (get_guardrail response or None, time read, ClientError or None)
+        self._lock = threading.Lock()
+
+    def describe(self, guardrail_id, guardrail_version):
+        """
+        :return: The get_guardrail response, read once for a numbered version and at most every
+                 draft_check_interval seconds for the DRAFT; None without a bedrock client
+        :raises ClientError: If the configuration cannot be read (failures are also remembered for
+                             draft_check_interval seconds; a configuration read earlier is returned instead)
+        """
+        if self.bedrock_client is None:
+            return None
+        key = (guardrail_id, guardrail_version)
+        with self._lock:
+            cached = self._guardrails.get(key)
+        if cached and (time.monotonic() - cached[1] < self.draft_check_interval
+                       or (guardrail_version != DRAFT_VERSION and cached[2] is None)):
+            if cached[2] is not None:
+                raise cached[2]
+            return cached[0]
+        try:
+            guardrail = self.bedrock_client.get_guardrail(guardrailIdentifier=guardrail_id, guardrailVersion=guardrail_version)
+            error = None
+        except ClientError as e:
+            # Keep using the last configuration read, if any, until the next check
+            guardrail = cached[0] if cached else None
+            error = e if guardrail is None else None
+        with self._lock:
+            self._guardrails[key] = (guardrail, time.monotonic(), error)
+        if error is not None:
+            raise error
+        return guardrail
+
+    def revision(self, guardrail_id, guardrail_version):
+        """
+        :return: The part of the cache key that changes when the guardrail is edited (the updatedAt of the
+                 DRAFT, empty for numbered versions). Compute it once per batch and pass it to get() and put().
+        """
+        if guardrail_version != DRAFT_VERSION:
+            return ""
+        try:
+            guardrail = self.describe(guardrail_id, guardrail_version)
+        except ClientError as e:
+            print(f"Error while reading guardrail configuration: {e}")
+            return ""
+        return str(guardrail.get("updatedAt", "")) if guardrail else ""
+
+    def _key(self, guardrail_id, guardrail_version, source, text, revision=None):
+        if revision is None:
+            revision = self.revision(guardrail_id, guardrail_version)
+        content_hash = hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{guardrail_id}|{guardrail_version}|{revision}|{source}|{content_hash}".encode("utf-8")).hexdigest()
+
+    def get(self, guardrail_id, guardrail_version, source, text, revision=None):
+        """
+        :param revision: Result of revision() for the guardrail, or None to compute it
+        :return: (action, list of Finding) of an earlier identical check, or None on a miss
+        """
+        max_age = self.draft_ttl if guardrail_version == DRAFT_VERSION else None
+        cached = self.cache.get(self._key(guardrail_id, guardrail_version, source, text, revision), max_age=max_age)
+        if cached is None:
+            return None
+        return cached["action"], [Finding(*fields) for fields in cached["findings"]]
+
+    def put(self, guardrail_id, guardrail_version, source, text, action, findings, revision=None):
+        self.cache.put(self._key(guardrail_id, guardrail_version, source, text, revision), {
+            "action": action,
+            "findings": [[getattr(finding, name) for name in Finding.__slots__] for finding in findings]
+        })
+
+    def stats(self):
+        return self.cache.stats()
+
+
+# Function to group texts into requests that respect the block and size limits
+def pack_texts(indexed_texts, max_blocks=MAX_BLOCKS_PER_REQUEST, max_characters=MAX_CHARACTERS_PER_REQUEST):
+    """
+    :param indexed_texts: List of (index, text)
+    :return: List of packs, each a list of (index, text)
+    """
+    packs = []
+    current, current_size = [], 0
+    for index, text in indexed_texts:
+        if current and (len(current) == max_blocks or current_size + len(text) > max_characters):
+            packs.append(current)
+            current, current_size = [], 0
+        current.append((index, text))
+        current_size += len(text)
+    if current:
+        packs.append(current)
+    return packs
+
+
+# Function to evaluate many texts with a guardrail, several texts per request and several requests at a time
+def evaluate_texts(client, guardrail_id, texts, guardrail_version="DRAFT", source="INPUT", prefilter=None,
+                   verdict_cache=None, max_workers=DEFAULT_MAX_WORKERS, max_blocks=MAX_BLOCKS_PER_REQUEST,
+                   max_characters=MAX_CHARACTERS_PER_REQUEST, guardrail=None):
+    """
+    A request with several content blocks gets one combined assessment, so a pack that passes
+    clears all its texts at once. A pack where the guardrail intervened is split in halves and
+    re-checked until every finding is attributed to a single text. Most texts of a moderation
+    backlog pass, so this takes far fewer requests than one call per text.
+
+    Model-based policies (topics, content filters, contextual grounding, PII entities) assess the
+    combined content, so a passing pack does not prove that each of its texts passes alone. Texts
+    are therefore only packed when the guardrail configuration is given and has none of them;
+    otherwise each text is sent in its own request (still several requests at a time).
+
+    :param client: 'bedrock-runtime' client
+    :param guardrail_id: Guardrail identifier
+    :param texts: Iterable of texts
+    :param guardrail_version: Guardrail version
+    :param source: 'INPUT' or 'OUTPUT'
+    :param prefilter: Optional GuardrailPrefilter; texts it can decide are not sent to the service
+    :param verdict_cache: Optional GuardrailVerdictCache; cached texts are not sent either, new results are stored
+    :param max_workers: Number of requests in flight
+    :param guardrail: Optional get_guardrail response of the guardrail version, used to decide whether texts can be packed
+    :return: List of Verdict, in the order of the texts
+    """
+    if not has_only_deterministic_policies(guardrail):
+        max_blocks = 1
+    texts = list(texts)
+    verdicts = [None] * len(texts)
+    # The DRAFT revision is part of every cache key; it is read once for the whole batch
+    revision = verdict_cache.revision(guardrail_id, guardrail_version) if verdict_cache else None
+    remaining = []
+    first_index_of = {}  # Normalized content -> index of its first occurrence
+    duplicates = []  # (index, index of the first occurrence)
+    for index, text in enumerate(texts):
+        findings = prefilter.check(text, source) if prefilter else None
+        if findings is not None:
+            verdicts[index] = Verdict(index, "GUARDRAIL_INTERVENED" if findings else "NONE", findings, origin="local")
+            continue
+        cached = verdict_cache.get(guardrail_id, guardrail_version, source, text, revision) if verdict_cache else None
+        if cached is not None:
+            verdicts[index] = Verdict(index, cached[0], cached[1], origin="cache")
+            continue
+        # Repeated texts of the batch are sent once
+        content = normalize_content(text)
+        if content in first_index_of:
+            duplicates.append((index, first_index_of[content]))
+        else:
+            first_index_of[content] = index
+            remaining.append((index, text))
+
+    def apply_guardrail(pack):
+        try:
+            response = client.apply_guardrail(
+                guardrailIdentifier=guardrail_id,
+                guardrailVersion=guardrail_version,
+                source=source,
+                content=[{"text": {"text": text}} for _, text in pack]
+            )
+        except ClientError as e:
+            for index, _ in pack:
+                verdicts[index] = Verdict(index, None, error=str(e))
+            return
+
+        action = response.get("action", "NONE")
+        if action == "GUARDRAIL_INTERVENED" and len(pack) > 1:
+            middle = len(pack) // 2
+            apply_guardrail(pack[:middle])
+            apply_guardrail(pack[middle:])
+            return
+        findings = parse_assessments(response.get("assessments", []))
+        for index, text in pack:
+            verdicts[index] = Verdict(index, action, findings)
+            if verdict_cache:
+                verdict_cache.put(guardrail_id, guardrail_version, source, text, action, findings, revision)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises any unexpected exception of the workers
+        list(executor.map(apply_guardrail, pack_texts(remaining, max_blocks, max_characters)))
+    for index, first_index in duplicates:
+        first = verdicts[first_index]
+        verdicts[index] = Verdict(index, first.action, first.findings, origin="cache" if not first.error else first.origin, error=first.error)
+    return verdicts
+
+
+# Function to aggregate verdicts into counts, without parsing any message
+def summarize_verdicts(verdicts):
+    """
+    :return: Dictionary with the number of texts, blocked texts, errors, texts decided locally or
+             from the cache and the blocked findings counted by (policy, type)
+    """
+    blocked_findings = Counter()
+    for verdict in verdicts:
+        for finding in verdict.findings:
+            if finding.action == "BLOCKED":
+                blocked_findings[(finding.policy, finding.type)] += 1
+    return {
+        "texts": len(verdicts),
+        "blocked": sum(1 for verdict in verdicts if verdict.blocked),
+        "errors": sum(1 for verdict in verdicts if verdict.error),
+        "decided_locally": sum(1 for verdict in verdicts if verdict.origin == "local"),
+        "from_cache": sum(1 for verdict in verdicts if verdict.origin == "cache"),
+        "blocked_findings": dict(blocked_findings)
+    }
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from bedrock_stats import percentile
+
+# Benchmark of knowledge base retrieval quality and latency.
+#
+# Usage:
+#   python bedrock_kb_benchmark.py documentation/02_knowledge_bases/retrieval_benchmark_queries.jsonl
+#   python bedrock_kb_benchmark.py queries.jsonl --local   (offline, with bedrock_local_retrieval.py)
+#
+# Each line of the query set is a JSON object:
+#   {"query": "Who is Alicia Torrence?", "knowledge_base": "athletes-knowledge-bases", "expected": "Alicia Torrence.md"}
+# 'expected' is matched against the end of the result location URI; use "none" when no document should be returned.
+
+DEFAULT_K_VALUES = [1, 3, 5]
+DEFAULT_THRESHOLDS = [round(0.05 * step, 2) for step in range(1, 19)]  # 0.05 to 0.90
+DEFAULT_CONCURRENCY = 4
+NO_EXPECTED_DOCUMENT = "none"
+
+
+# Function to read the labeled query set
+def load_query_set(path):
+    with open(path, encoding="utf-8") as query_file:
+        return [json.loads(line) for line in query_file if line.strip()]
+
+
+# Function to extract the document URI of a retrieval result, whatever its data source type
+def get_result_uri(result):
+    location = result.get("location", {})
+    for value in location.values():
+        if isinstance(value, dict) and value.get("uri"):
+            return value["uri"]
+    return ""
+
+
+# Function to check whether a retrieval result is the document expected for a query
+def is_expected_document(result, expected):
+    return expected != NO_EXPECTED_DOCUMENT and get_result_uri(result).endswith(expected)
+
+
+# Function to run every query of the set with numberOfResults = k and measure its latency
+def run_query_set(client, resolve_knowledge_base_id, query_set, k, concurrency):
+    """
+    :param client: Object with a retrieve() method (bedrock-agent-runtime client or LocalRetrievalClient)
+    :param resolve_knowledge_base_id: Function mapping a knowledge base name to its ID
+    :param query_set: Labeled queries
+    :param k: numberOfResults sent with each query
+    :param concurrency: Number of queries in flight
+    :return: List of {'results': [...], 'latency_ms': ..., 'error': ...}, in the order of the query set
+    """
+    # The IDs are resolved before any query runs, so a name lookup is never part of a measured latency
+    knowledge_base_ids = {}  # Name -> (ID, error)
+    for labeled_query in query_set:
+        name = labeled_query["knowledge_base"]
+        if name not in knowledge_base_ids:
+            try:
+                knowledge_base_ids[name] = (resolve_knowledge_base_id(name), None)
+            except (ClientError, ValueError) as error:
+                knowledge_base_ids[name] = (None, str(error))
+
+    def run_query(labeled_query):
+        knowledge_base_id, error = knowledge_base_ids[labeled_query["knowledge_base"]]
+        if error:
+            return {"results": [], "latency_ms": None, "error": error}
+        start_time = time.perf_counter()
+        try:
+            response = client.retrieve(
+                knowledgeBaseId=knowledge_base_id,
+                retrievalQuery={"text": labeled_query["query"]},
+                retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": k}}
+            )
+            latency_ms = (time.perf_counter() - start_time) * 1000
+        except (ClientError, ValueError) as error:
+            return {"results": [], "latency_ms": None, "error": str(error)}
+        return {"results": response.get("retrievalResults", []), "latency_ms": latency_ms, "error": None}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(run_query, query_set))
+
+
+# Function to compute the quality metrics of one run for a relevance threshold
+def evaluate(query_set, runs, threshold):
+    """
+    :return: Dictionary with recall, precision and false-positive rate
+        - recall: share of the queries with an expected document that returned it above the threshold
+        - precision: share of the results above the threshold that are the expected document
+        - false_positive_rate: share of the 'none' queries that returned any result above the threshold
+    """
+    positives = hits = returned = relevant_returned = negatives = false_positives = 0
+    for labeled_query, run in zip(query_set, runs):
+        expected = labeled_query.get("expected", NO_EXPECTED_DOCUMENT)
+        kept = [result for result in run["results"] if result.get("score", 0) >= threshold]
+        relevant = [result for result in kept if is_expected_document(result, expected)]
+        returned += len(kept)
+        relevant_returned += len(relevant)
+        if expected == NO_EXPECTED_DOCUMENT:
+            negatives += 1
+            false_positives += bool(kept)
+        else:
+            positives += 1
+            hits += bool(relevant)
+
+    return {
+        "recall": hits / positives if positives else None,
+        "precision": relevant_returned / returned if returned else None,
+        "false_positive_rate": false_positives / negatives if negatives else None
+    }
+
+
+# Function to pick the k and threshold with the best balance between recall and precision
+def recommend(rows, max_p95_ms=None):
+    """
+    Maximizes the F1 score of recall and precision; ties go to the lower p95 latency, then the smaller k.
+
+    :param rows: Report rows (one per k and threshold)
+    :param max_p95_ms: Optional latency budget; rows above it are not recommended
+    :return: The recommended row, or None
+    """
+    def f1(row):
+        recall, precision = row["recall"] or 0, row["precision"] or 0
+        return 2 * recall * precision / (recall + precision) if recall + precision else 0
+
+    candidates = [row for row in rows if max_p95_ms is None or (row["p95_ms"] is not None and row["p95_ms"] <= max_p95_ms)]
+    if not candidates:
+        return None
+    # Latency is compared at 0.1 ms resolution, so measurement noise does not outweigh a smaller k
+    return max(candidates, key=lambda row: (round(f1(row), 6), -round(row["p95_ms"] or 0, 1), -row["k"]))
+
+
+# Function to benchmark the query set for every k and threshold
+def run_benchmark(client, resolve_knowledge_base_id, query_set, k_values=None, thresholds=None, concurrency=DEFAULT_CONCURRENCY):
+    """
+    :return: List of report rows with k, threshold, quality metrics, latency percentiles and error count
+    """
+    rows = []
+    for k in k_values or DEFAULT_K_VALUES:
+        runs = run_query_set(client, resolve_knowledge_base_id, query_set, k, concurrency)
+        latencies = [run["latency_ms"] for run in runs if run["latency_ms"] is not None]
+        errors = sum(1 for run in runs if run["error"])
+        for threshold in thresholds or DEFAULT_THRESHOLDS:
+            row = {"k": k, "threshold": threshold}
+            row.update(evaluate(query_set, runs, threshold))
+            row.update({
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "errors": errors
+            })
+            rows.append(row)
+    return rows
+
+
+# Function to print the report as a table
+def print_report(rows, recommendation):
+    def fmt(value, pattern):
+        return pattern.format(value) if value is not None else "n/a"
+
+    print(f"{'k':>3} {'threshold':>9} {'recall':>7} {'precision':>9} {'FPR':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for row in rows:
+        print(f"{row['k']:>3} {row['threshold']:>9.2f} {fmt(row['recall'], '{:.2f}'):>7} {fmt(row['precision'], '{:.2f}'):>9} "
+              f"{fmt(row['false_positive_rate'], '{:.2f}'):>6} {fmt(row['p50_ms'], '{:.1f}'):>8} "
+              f"{fmt(row['p95_ms'], '{:.1f}'):>8} {fmt(row['p99_ms'], '{:.1f}'):>8} {row['errors']:>6}")
+    if recommendation:
+        print(f"\nRecommended: k={recommendation['k']}, threshold={recommendation['threshold']:.2f} "
+              f"(recall {fmt(recommendation['recall'], '{:.2f}')}, precision {fmt(recommendation['precision'], '{:.2f}')}, "
+              f"false-positive rate {fmt(recommendation['false_positive_rate'], '{:.2f}')}, p95 {fmt(recommendation['p95_ms'], '{:.1f}')} ms)")
+    else:
+        print("\nNo configuration meets the latency budget.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Knowledge base retrieval benchmark and threshold tuning")
+    parser.add_argument("query_set", help="JSONL file with labeled queries")
+    parser.add_argument("--local", action="store_true", help="Use the local index of the sample documents instead of retrieve()")
+    parser.add_argument("--k", default=",".join(map(str, DEFAULT_K_VALUES)), help="Comma-separated numberOfResults values (default: 1,3,5)")
+    parser.add_argument("--thresholds", help="Comma-separated relevance thresholds (default: 0.05 to 0.90 in steps of 0.05)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Queries in flight (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--max-p95-ms", type=float, help="Latency budget for the recommendation")
+    parser.add_argument("--output", help="Optional JSON file receiving the report rows")
+    args = parser.parse_args()
+
+    if args.local:
+        from bedrock_local_retrieval import create_local_retrieval_client
+        retrieval_client = create_local_retrieval_client()
+        resolve_id = lambda name: name  # Local knowledge bases use their name as ID
+    else:
+        import boto3
+        from bedrock_resolver import BedrockResourceResolver
+        from bedrock_scheduler import SCHEDULER_CLIENT_CONFIG, scheduled_client
+        retrieval_client = scheduled_client(boto3.client('bedrock-agent-runtime', config=SCHEDULER_CLIENT_CONFIG))
+        resolver = BedrockResourceResolver(bedrock_agent_client=boto3.client('bedrock-agent'))
+
+        def resolve_id(name):
+            knowledge_base_id = resolver.knowledge_base_id(name)
+            if not knowledge_base_id:
+                raise ValueError(f"Knowledge Base '{name}' not found.")
+            return knowledge_base_id
+
+    report_rows = run_benchmark(
+        retrieval_client,
+        resolve_id,
+        load_query_set(args.query_set),
+        k_values=[int(value) for value in args.k.split(",")],
+        thresholds=[float(value) for value in args.thresholds.split(",")] if args.thresholds else None,
+        concurrency=args.concurrency
+    )
+    best = recommend(report_rows, args.max_p95_ms)
+    print_report(report_rows, best)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as report_file:
+            json.dump({"rows": report_rows, "recommendation": best}, report_file, indent=2)
+        print(f"Report saved to {os.path.abspath(args.output)}")
@@ -0,0 +1,269 @@
+import json
+import os
+import re
+import zlib
+import numpy as np
+from botocore.exceptions import ClientError
+
+# Note:
+# This module needs NumPy, which is not required by the other scripts:
+# pip3 install numpy
+
+DEFAULT_CHUNK_SIZE = 1000  # Maximum characters per chunk
+DEFAULT_CHUNK_OVERLAP = 200  # Characters of the previous chunk repeated at the start of the next one
+HASHING_DIMENSIONS = 1024
+TITAN_EMBEDDING_MODEL_ID = 'amazon.titan-embed-text-v2:0'
+
+# Sample documents of the knowledge base tutorial, indexed under the knowledge base names used by the scripts
+SAMPLE_DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'documentation', '02_knowledge_bases', 'sample-s3-bedrock-knowledge-bases')
+SAMPLE_KNOWLEDGE_BASE_DIRS = {
+    'athletes-knowledge-bases': os.path.join(SAMPLE_DOCUMENTS_DIR, 'athletes'),
+    'musicians-knowledge-bases': os.path.join(SAMPLE_DOCUMENTS_DIR, 'musicians')
+}
+DEFAULT_INDEX_DIR = '.local_kb_index'
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.json"
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he", "her", "his", "in", "is",
+    "it", "its", "me", "of", "on", "or", "she", "that", "the", "their", "to", "was", "were", "what",
+    "who", "with"
+}
+
+
+# Function to split a markdown document into overlapping chunks of paragraphs
+def chunk_markdown(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    :param text: Markdown content
+    :param chunk_size: Maximum characters per chunk
+    :param overlap: Characters of the end of a chunk repeated at the start of the next one
+    :return: List of chunk texts
+    """
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        # Paragraphs longer than a chunk are split on their own
+        while len(paragraph) > chunk_size:
+            paragraphs.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size - overlap:]
+        if paragraph:
+            paragraphs.append(paragraph)
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: hashes the words and word pairs of a text into a fixed-size vector.
+
+    It only captures lexical overlap, which is enough for small corpora of named entities and for
+    running the retrieval code without AWS. Use TitanEmbedder for semantic similarity.
+    """
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text):
+        words = [word for word in re.findall(r"\w+", text.lower()) if word not in STOP_WORDS]
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def embed(self, texts):
+        """
+        :param texts: List of texts
+        :return: float32 matrix with one L2-normalized row per text
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 is stable across processes (unlike hash()), so persisted indexes stay valid
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dimensions] += sign
+        return normalize_rows(vectors)
+
+
+class TitanEmbedder:
+    """
+    Embedder backed by Amazon Titan Text Embeddings through a 'bedrock-runtime' client.
+    """
+
+    def __init__(self, bedrock_runtime_client, model_id=TITAN_EMBEDDING_MODEL_ID, dimensions=1024):
+        self.client = bedrock_runtime_client
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.name = f"{model_id}-{dimensions}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            response = self.client.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps({"inputText": text, "dimensions": self.dimensions, "normalize": True})
+            )
+            vectors[row] = json.loads(response["body"].read())["embedding"]
+        return normalize_rows(vectors)
+
+
+# Function to scale each row of a matrix to unit length, so a dot product is the cosine similarity
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+class LocalKnowledgeBase:
+    """
+    In-process vector index over a folder of markdown documents.
+
+    Chunk embeddings are stored in one contiguous float32 matrix, so a query is scored against every
+    chunk with a single matrix-vector product. Saved indexes are reopened as memory-mapped files.
+    """
+
+    def __init__(self, embeddings, chunks, embedder):
+        """
+        :param embeddings: float32 matrix (chunks x dimensions) of normalized embeddings
+        :param chunks: List of {'text': ..., 'source': ...} dictionaries, one per matrix row
+        :param embedder: Embedder used for the chunks, also used for the queries
+        """
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.embedder = embedder
+
+    @classmethod
+    def build(cls, documents_dir, embedder=None, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+        """
+        Chunks and embeds every .md file under documents_dir.
+        """
+        embedder = embedder or HashingEmbedder()
+        chunks = []
+        for root, _, file_names in sorted(os.walk(documents_dir)):
+            for file_name in sorted(file_names):
+                if not file_name.endswith(".md"):
+                    continue
+                path = os.path.join(root, file_name)
+                with open(path, encoding="utf-8") as document:
+                    for text in chunk_markdown(document.read(), chunk_size, overlap):
+                        chunks.append({"text": text, "source": path})
+
+        embeddings = embedder.embed([chunk["text"] for chunk in chunks]) if chunks else np.zeros((0, embedder.dimensions), dtype=np.float32)
+        return cls(embeddings, chunks, embedder)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, EMBEDDINGS_FILE), self.embeddings)
+        with open(os.path.join(index_dir, CHUNKS_FILE), "w", encoding="utf-8") as chunks_file:
+            json.dump({"embedder": self.embedder.name, "chunks": self.chunks}, chunks_file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir, embedder=None):
+        """
+        Opens a saved index; the embedding matrix is memory-mapped instead of read into memory.
+        """
+        embedder = embedder or HashingEmbedder()
+        with open(os.path.join(index_dir, CHUNKS_FILE), encoding="utf-8") as chunks_file:
+            metadata = json.load(chunks_file)
+        if metadata["embedder"] != embedder.name:
+            raise ValueError(f"Index in '{index_dir}' was built with '{metadata['embedder']}', not '{embedder.name}'.")
+        embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        return cls(embeddings, metadata["chunks"], embedder)
+
+    @classmethod
+    def load_or_build(cls, documents_dir, index_dir, embedder=None):
+        """
+        Loads the index saved in index_dir, rebuilding it when it is missing or older than any document.
+        """
+        embedder = embedder or HashingEmbedder()
+        embeddings_path = os.path.join(index_dir, EMBEDDINGS_FILE)
+        if os.path.exists(embeddings_path):
+            index_time = os.path.getmtime(embeddings_path)
+            documents_time = max((os.path.getmtime(os.path.join(root, name))
+                                  for root, _, names in os.walk(documents_dir) for name in names), default=0)
+            if documents_time <= index_time:
+                try:
+                    return cls.load(index_dir, embedder)
+                except ValueError:
+                    pass  # Built with another embedder; rebuild below
+        knowledge_base = cls.build(documents_dir, embedder)
+        knowledge_base.save(index_dir)
+        return cls.load(index_dir, embedder)
+
+    def retrieve(self, query, number_of_results=5):
+        """
+        Scores the query against every chunk and returns the best ones in the shape of the
+        bedrock-agent-runtime retrieve() response.
+
+        The score is the cosine similarity clipped at 0, so an unrelated chunk scores close to 0
+        and values stay between 0 and 1.
+
+        :param query: Query text
+        :param number_of_results: Maximum number of results
+        :return: {'retrievalResults': [{'content': {'text': ...}, 'location': ..., 'score': ...}, ...]}
+        """
+        if not self.chunks or number_of_results <= 0:
+            return {"retrievalResults": []}
+
+        query_vector = self.embedder.embed([query])[0]
+        similarities = self.embeddings @ query_vector
+        k = min(number_of_results, len(similarities))
+        # argpartition finds the k best rows in linear time; only those k are sorted
+        top_rows = np.argpartition(-similarities, k - 1)[:k]
+        top_rows = top_rows[np.argsort(-similarities[top_rows])]
+
+        return {"retrievalResults": [
+            {
+                "content": {"text": self.chunks[row]["text"]},
+                "location": {"type": "LOCAL", "localLocation": {"uri": self.chunks[row]["source"]}},
+                "score": float(max(0.0, similarities[row]))
+            }
+            for row in top_rows
+        ]}
+
+
+class LocalRetrievalClient:
+    """
+    Offline stand-in for the 'bedrock-agent-runtime' client: retrieve() is served by LocalKnowledgeBase
+    objects registered under a knowledge base ID.
+    """
+
+    def __init__(self, knowledge_bases):
+        """
+        :param knowledge_bases: Dictionary {knowledge_base_id: LocalKnowledgeBase}
+        """
+        self.knowledge_bases = knowledge_bases
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration=None, **kwargs):
+        number_of_results = (retrievalConfiguration or {}).get("vectorSearchConfiguration", {}).get("numberOfResults", 5)
+        knowledge_base = self.knowledge_bases.get(knowledgeBaseId)
+        if knowledge_base is None:
+            # Same error as the service, so callers handle both clients the same way
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException", "Message": f"Local knowledge base '{knowledgeBaseId}' not found."}},
+                "Retrieve"
+            )
+        return knowledge_base.retrieve(retrievalQuery["text"], number_of_results)
+
+
+# Function to build a LocalRetrievalClient serving one local knowledge base per documents folder
+def create_local_retrieval_client(knowledge_base_dirs=None, index_dir=DEFAULT_INDEX_DIR, embedder=None):
+    """
+    :param knowledge_base_dirs: Dictionary {knowledge_base_name: documents_dir}, the sample documents by default
+    :param index_dir: Folder where the indexes are saved (one sub-folder per knowledge base)
+    :param embedder: Embedder of the indexes, HashingEmbedder by default
+    :return: LocalRetrievalClient using the knowledge base names as IDs
+    """
+    knowledge_base_dirs = knowledge_base_dirs or SAMPLE_KNOWLEDGE_BASE_DIRS
+    return LocalRetrievalClient({
+        name: LocalKnowledgeBase.load_or_build(documents_dir, os.path.join(index_dir, name), embedder)
+        for name, documents_dir in knowledge_base_dirs.items()
+    })
@@ -0,0 +1,145 @@
+import threading
+import time
+from botocore.exceptions import ClientError
+
+DEFAULT_TTL_SECONDS = 300  # Age after which an index is refreshed in the background
+MIN_RELOAD_INTERVAL_SECONDS = 5  # A miss reloads the index at most this often, so unknown names cannot cause a storm of listings
+
+
+# Function to build a name -> ID dictionary from a paginated control-plane listing
+def build_paginated_index(client, operation, result_key, name_key, id_key, **list_arguments):
+    """
+    :param client: boto3 client offering the listing operation
+    :param operation: Name of the paginated operation (e.g. 'list_agents')
+    :param result_key: Key of the summaries list in each page
+    :param name_key: Key of the name in each summary
+    :param id_key: Key of the ID in each summary
+    :param list_arguments: Extra arguments of the listing (e.g. agentId)
+    :return: Dictionary mapping names to IDs
+    """
+    index = {}
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(**list_arguments):
+        for summary in page.get(result_key, []):
+            index[summary.get(name_key)] = summary.get(id_key)
+    return index
+
+
+class NameIndex:
+    """
+    Cached name -> ID index of one kind of resource.
+
+    The index is loaded on first use and served from memory afterwards. Once it is older than the TTL
+    it keeps being served while a background thread reloads it, so lookups never wait for a refresh.
+    A name that is not in the index triggers a synchronous reload (rate-limited), so resources created
+    after the index was built are still found.
+    """
+
+    def __init__(self, load_index, ttl=DEFAULT_TTL_SECONDS, min_reload_interval=MIN_RELOAD_INTERVAL_SECONDS):
+        """
+        :param load_index: Function returning a fresh name -> ID dictionary
+        :param ttl: Age in seconds after which the index is refreshed in the background
+        :param min_reload_interval: Minimum time in seconds between two reloads caused by misses
+        """
+        self.load_index = load_index
+        self.ttl = ttl
+        self.min_reload_interval = min_reload_interval
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def resolve(self, name):
+        """
+        :param name: Name of the resource
+        :return: The resource ID, or None if no resource has this name
+        """
+        with self._lock:
+            index = self._index
+            age = time.monotonic() - self._loaded_at
+
+        if index is None:
+            index = self._reload()
+        elif age > self.ttl:
+            self._refresh_in_background()
+
+        resource_id = index.get(name)
+        if resource_id is None and time.monotonic() - self._loaded_at > self.min_reload_interval:
+            # Invalidate on miss: the resource may have been created after the index was built
+            resource_id = self._reload().get(name)
+        return resource_id
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def _reload(self):
+        index = self.load_index()
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+        return index
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self._reload()
+            except ClientError as e:
+                # Keep serving the previous index; the next lookup after the TTL tries again
+                print(f"Error while refreshing the name index: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+class BedrockResourceResolver:
+    """
+    Resolves knowledge base, guardrail, agent and agent alias names to IDs using cached NameIndex objects.
+    """
+
+    def __init__(self, bedrock_agent_client=None, bedrock_client=None, ttl=DEFAULT_TTL_SECONDS):
+        """
+        :param bedrock_agent_client: 'bedrock-agent' client (knowledge bases, agents and aliases)
+        :param bedrock_client: 'bedrock' client (guardrails)
+        :param ttl: Age in seconds after which an index is refreshed in the background
+        """
+        self.bedrock_agent_client = bedrock_agent_client
+        self.bedrock_client = bedrock_client
+        self.ttl = ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _get_index(self, key, load_index):
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = NameIndex(load_index, ttl=self.ttl)
+            return index
+
+    def knowledge_base_id(self, knowledge_base_name):
+        index = self._get_index("knowledge_bases", lambda: build_paginated_index(
+            self.bedrock_agent_client, 'list_knowledge_bases', 'knowledgeBaseSummaries', 'name', 'knowledgeBaseId'))
+        return index.resolve(knowledge_base_name)
+
+    def guardrail_id(self, guardrail_name):
+        index = self._get_index("guardrails", lambda: build_paginated_index(
+            self.bedrock_client, 'list_guardrails', 'guardrails', 'name', 'id'))
+        return index.resolve(guardrail_name)
+
+    def agent_id(self, agent_name):
+        index = self._get_index("agents", lambda: build_paginated_index(
+            self.bedrock_agent_client, 'list_agents', 'agentSummaries', 'agentName', 'agentId'))
+        return index.resolve(agent_name)
+
+    def agent_alias_id(self, agent_id, alias_name):
+        index = self._get_index(("agent_aliases", agent_id), lambda: build_paginated_index(
+            self.bedrock_agent_client, 'list_agent_aliases', 'agentAliasSummaries', 'agentAliasName', 'agentAliasId',
+            agentId=agent_id))
+        return index.resolve(alias_name)
@@ -0,0 +1,302 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+# Client-side quotas, in requests per minute (rpm) and tokens per minute (tpm); None means unlimited.
+# Keys are looked up in this order: '<group>:<model ID>', '<group>', 'default'.
+# All model APIs (converse, invoke_model and their streaming variants) share the 'model' group,
+# because Bedrock counts them against the same per-model quota. Adjust these values to the
+# quotas of your account (Service Quotas console > Amazon Bedrock).
+DEFAULT_QUOTAS = {
+    "default": {"rpm": 60, "tpm": None},
+    "model": {"rpm": 100, "tpm": 100000},
+    "model:meta.llama3-8b-instruct-v1:0": {"rpm": 800, "tpm": 300000},
+    "retrieve": {"rpm": 300, "tpm": None},
+    "apply_guardrail": {"rpm": 300, "tpm": None},
+    "invoke_agent": {"rpm": 60, "tpm": None},
+    "invoke_flow": {"rpm": 60, "tpm": None}
+}
+
+# Quota group of each scheduled API
+SCHEDULED_APIS = {
+    "converse": "model",
+    "converse_stream": "model",
+    "invoke_model": "model",
+    "invoke_model_with_response_stream": "model",
+    "retrieve": "retrieve",
+    "apply_guardrail": "apply_guardrail",
+    "invoke_agent": "invoke_agent",
+    "invoke_flow": "invoke_flow"
+}
+
+THROTTLING_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException"}
+# Server-side failures worth retrying; unlike throttles they do not slow down the quota group
+TRANSIENT_ERROR_CODES = {"ServiceUnavailableException", "InternalServerException", "InternalFailure",
+                         "ServiceUnavailable", "ModelNotReadyException"}
+
+BURST_SECONDS = 10  # Each bucket holds at most 10 seconds worth of quota, so a fresh scheduler cannot burst a full minute at once
+MIN_RATE_FACTOR = 0.1  # Lowest fraction of the configured quota used after repeated throttles
+RATE_RECOVERY_STEP = 0.05  # Fraction of the quota recovered after each successful call
+
+# Botocore retries throttled calls on its own, hiding the throttles from the scheduler.
+# Create scheduled clients with this configuration so the scheduler is the only one retrying:
+# it retries throttles, connection and read errors, and 5xx/transient service errors.
+SCHEDULER_CLIENT_CONFIG = Config(retries={"mode": "standard", "total_max_attempts": 1})
+
+
+# Function to estimate the number of tokens in a text without calling the service
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English text; good enough to keep the payload under a budget
+    return (len(text) + 3) // 4
+
+
+# Function to estimate the tokens a request will consume (input plus the maximum output)
+def estimate_request_tokens(api, request):
+    """
+    :param api: Name of the client method
+    :param request: Keyword arguments of the call
+    :return: Estimated token cost of the request
+    """
+    if api in ("converse", "converse_stream"):
+        texts = [block.get("text", "") for message in request.get("messages", []) for block in message.get("content", [])]
+        texts += [block.get("text", "") for block in request.get("system", [])]
+        max_tokens = request.get("inferenceConfig", {}).get("maxTokens", 0)
+        return sum(estimate_tokens(text) for text in texts) + max_tokens
+    if api in ("invoke_model", "invoke_model_with_response_stream"):
+        body = request.get("body", "")
+        try:
+            native_request = json.loads(body)
+        except (TypeError, ValueError):
+            native_request = {}
+        # Output limit field names used by the native APIs of the different model providers
+        max_tokens = next((native_request[field] for field in ("max_gen_len", "max_tokens", "maxTokenCount")
+                           if isinstance(native_request.get(field), int)), 0)
+        return estimate_tokens(body if isinstance(body, str) else "") + max_tokens
+    if api == "retrieve":
+        return estimate_tokens(request.get("retrievalQuery", {}).get("text", ""))
+    if api == "invoke_agent":
+        return estimate_tokens(request.get("inputText", ""))
+    return 0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per-minute rate.
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds=BURST_SECONDS):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate_per_second * burst_seconds)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now, rate_factor):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second * rate_factor)
+        self.updated_at = now
+
+    def wait_time(self, amount, rate_factor):
+        # A request larger than the bucket only waits for a full bucket and leaves it in debt
+        missing = min(amount, self.capacity) - self.tokens
+        return 0.0 if missing <= 0 else missing / (self.rate_per_second * rate_factor)
+
+    def consume(self, amount):
+        self.tokens -= amount
+
+
+class QuotaState:
+    """
+    Buckets, adaptive rate and FIFO waiting queue of one quota group.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.rate_factor = 1.0
+        self.blocked_until = 0.0
+        self.waiting = deque()
+        self.condition = threading.Condition()
+        self.requests = 0
+        self.throttles = 0
+
+    def _costs(self, estimated_tokens):
+        # Each request takes one unit from the request bucket and its estimated tokens from the token bucket
+        return [(bucket, cost) for bucket, cost in ((self.request_bucket, 1), (self.token_bucket, estimated_tokens)) if bucket]
+
+    def acquire(self, estimated_tokens):
+        """
+        Blocks until the request can be sent. Callers are served strictly in arrival order, so a large
+        request is not starved by a stream of small ones.
+        """
+        ticket = object()
+        with self.condition:
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    if self.waiting[0] is ticket:
+                        now = time.monotonic()
+                        wait = self.blocked_until - now
+                        for bucket, cost in self._costs(estimated_tokens):
+                            bucket.refill(now, self.rate_factor)
+                            wait = max(wait, bucket.wait_time(cost, self.rate_factor))
+                        if wait <= 0:
+                            for bucket, cost in self._costs(estimated_tokens):
+                                bucket.consume(cost)
+                            self.requests += 1
+                            return
+                        self.condition.wait(wait)
+                    else:
+                        self.condition.wait()
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    def refund(self, tokens):
+        # Gives back (or takes, when negative) the difference between the estimated and the actual token usage
+        if self.token_bucket and tokens:
+            with self.condition:
+                self.token_bucket.tokens = min(self.token_bucket.capacity, self.token_bucket.tokens + tokens)
+                self.condition.notify_all()
+
+    def on_throttle(self, attempt, base_backoff, max_backoff):
+        """
+        Halves the sending rate and pauses the whole group, so queued callers do not keep hitting the quota.
+
+        :return: Pause in seconds
+        """
+        delay = random.uniform(0, min(max_backoff, base_backoff * 2 ** attempt))  # Full jitter
+        with self.condition:
+            self.throttles += 1
+            self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.condition.notify_all()
+        return delay
+
+    def on_success(self):
+        with self.condition:
+            self.rate_factor = min(1.0, self.rate_factor + RATE_RECOVERY_STEP)
+
+
+class QuotaScheduler:
+    """
+    Client-side scheduler keeping Bedrock calls within requests-per-minute and tokens-per-minute quotas.
+
+    Each quota group (per model for the model APIs) has a request bucket and a token bucket. Requests
+    pre-reserve their estimated token cost, wait in a FIFO queue, and throttled calls are retried with
+    exponential backoff while the group's rate is reduced (and recovered gradually after successes).
+    Connection errors, read timeouts and 5xx/transient service errors are retried with backoff as well.
+    """
+
+    def __init__(self, quotas=None, max_retries=6, base_backoff=1.0, max_backoff=30.0):
+        """
+        :param quotas: Quota configuration, see DEFAULT_QUOTAS
+        :param max_retries: Retries of a throttled or failed call before the error is raised to the caller
+        :param base_backoff: Initial backoff in seconds
+        :param max_backoff: Maximum backoff in seconds
+        """
+        self.quotas = quotas or DEFAULT_QUOTAS
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _get_state(self, group, model_id):
+        key = f"{group}:{model_id}" if model_id else group
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                quota = self.quotas.get(key) or self.quotas.get(group) or self.quotas.get("default", {})
+                state = self._states[key] = QuotaState(quota.get("rpm"), quota.get("tpm"))
+            return state
+
+    def call(self, api, operation, **request):
+        """
+        Sends a request through the scheduler.
+
+        Note: throttles reported inside an event stream (e.g. while reading invoke_agent or invoke_flow
+        events) happen after the call returned and are not retried here.
+
+        :param api: Name of the client method, used to pick the quota group
+        :param operation: The bound client method
+        :param request: Keyword arguments of the call
+        :return: The response of the call
+        """
+        group = SCHEDULED_APIS.get(api, "default")
+        state = self._get_state(group, request.get("modelId") if group == "model" else None)
+        estimated_tokens = estimate_request_tokens(api, request)
+
+        for attempt in range(self.max_retries + 1):
+            state.acquire(estimated_tokens)
+            try:
+                response = operation(**request)
+            except ClientError as error:
+                code = error.response.get("Error", {}).get("Code")
+                status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+                if attempt == self.max_retries:
+                    raise
+                if code in THROTTLING_ERROR_CODES:
+                    delay = state.on_throttle(attempt, self.base_backoff, self.max_backoff)
+                    print(f"Throttled on {api}, retrying in {delay:.1f} s (attempt {attempt + 1} of {self.max_retries}).")
+                    continue
+                if code not in TRANSIENT_ERROR_CODES and status < 500:
+                    raise
+                self._retry_pause(api, code, attempt)
+                continue
+            except (ConnectionError, HTTPClientError) as error:
+                # Connection failures and read timeouts (botocore's own retries are disabled by SCHEDULER_CLIENT_CONFIG)
+                if attempt == self.max_retries:
+                    raise
+                self._retry_pause(api, type(error).__name__, attempt)
+                continue
+
+            state.on_success()
+            actual_tokens = response.get("usage", {}).get("totalTokens") if isinstance(response, dict) else None
+            if actual_tokens is not None:
+                state.refund(estimated_tokens - actual_tokens)
+            return response
+
+    def _retry_pause(self, api, reason, attempt):
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))  # Full jitter
+        print(f"{reason} on {api}, retrying in {delay:.1f} s (attempt {attempt + 1} of {self.max_retries}).")
+        time.sleep(delay)
+
+    def stats(self):
+        """
+        :return: Dictionary with the requests sent, throttles received and current rate factor of each quota group
+        """
+        with self._lock:
+            return {key: {"requests": state.requests, "throttles": state.throttles, "rate_factor": state.rate_factor}
+                    for key, state in self._states.items()}
+
+
+class ScheduledClient:
+    """
+    Wraps a boto3 client so the quota-limited APIs go through a QuotaScheduler.
+    Every other attribute (paginators, control-plane calls, exceptions) is forwarded unchanged.
+    """
+
+    def __init__(self, client, scheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in SCHEDULED_APIS:
+            return attribute
+
+        def scheduled_operation(**request):
+            return self._scheduler.call(name, attribute, **request)
+        return scheduled_operation
+
+
+# Scheduler shared by every client of the process, so all scripts and threads respect the same quotas
+default_scheduler = QuotaScheduler()
+
+
+# Function to wrap a boto3 client with the shared scheduler
+def scheduled_client(client, scheduler=None):
+    return ScheduledClient(client, scheduler or default_scheduler)
@@ -0,0 +1,132 @@
+import threading
+import time
+import numpy as np
+from bedrock_local_retrieval import HashingEmbedder
+
+# Note:
+# This module needs NumPy, which is not required by the other scripts:
+# pip3 install numpy
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.9  # Cosine similarity above which two queries are considered the same question
+# Threshold used with the default HashingEmbedder, which only measures word overlap: "Who is Alicia Torrence?"
+# and "Tell me about Alicia Torrence" score 0.65 and questions about other people 0 to 0.33, but other
+# questions about the same person ("Where was Alicia Torrence born?") also score about 0.6
+LEXICAL_SIMILARITY_THRESHOLD = 0.6
+DEFAULT_CAPACITY = 1000  # Maximum number of cached queries (all knowledge bases together)
+DEFAULT_TTL_SECONDS = 3600  # Cached results are reused for at most one hour
+NEAR_MISS_MARGIN = 0.05  # Misses this close to the threshold are counted as near misses
+
+
+class SemanticQueryCache:
+    """
+    Cache of retrieval results keyed by the meaning of the query.
+
+    Each query is embedded and compared (cosine similarity, one matrix-vector product) with the
+    earlier queries of the same knowledge base. If the most similar one is above the threshold and
+    not expired, its results are returned instead of calling retrieve(). When the cache is full, the
+    least recently used entry is replaced.
+
+    Without an embedder, queries are compared by word overlap (HashingEmbedder), which cannot tell two
+    questions about the same subject apart; pass a TitanEmbedder to compare them by meaning.
+    """
+
+    def __init__(self, embedder=None, similarity_threshold=None,
+                 capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL_SECONDS):
+        """
+        :param embedder: Object with embed(texts) returning normalized vectors (see bedrock_local_retrieval.py),
+                         or None for a HashingEmbedder
+        :param similarity_threshold: Minimum cosine similarity for a cache hit (by default DEFAULT_SIMILARITY_THRESHOLD,
+                                     or LEXICAL_SIMILARITY_THRESHOLD with the default embedder)
+        :param capacity: Maximum number of cached queries
+        :param ttl: Time in seconds a cached result can be reused
+        """
+        if similarity_threshold is None:
+            similarity_threshold = DEFAULT_SIMILARITY_THRESHOLD if embedder else LEXICAL_SIMILARITY_THRESHOLD
+        self.embedder = embedder or HashingEmbedder()
+        self.similarity_threshold = similarity_threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._embeddings = np.zeros((capacity, self.embedder.dimensions), dtype=np.float32)
+        self._knowledge_base_codes = np.full(capacity, -1)  # Knowledge base of each slot, as an index in _code_of
+        self._result_counts = np.zeros(capacity, dtype=np.int64)  # numberOfResults requested for each slot
+        self._entries = [None] * capacity  # (query, results)
+        self._code_of = {}  # knowledge_base_id -> integer code
+        self._stored_at = np.full(capacity, -np.inf)
+        self._last_used = np.full(capacity, -np.inf)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        # Margin between the similarity of a hit and the threshold (how close the hits were to being misses)
+        self._hit_margin_sum = 0.0
+        self._min_hit_margin = None
+
+    def _embed(self, query):
+        return self.embedder.embed([query])[0]
+
+    def lookup(self, knowledge_base_id, query, number_of_results):
+        """
+        :param knowledge_base_id: Knowledge base the query is sent to
+        :param query: Query text
+        :param number_of_results: Number of results requested
+        :return: Cached retrieval results, or None on a miss
+        """
+        query_vector = self._embed(query)
+        now = time.monotonic()
+        with self._lock:
+            valid = ((self._knowledge_base_codes == self._code_of.get(knowledge_base_id, -2))
+                     & (self._result_counts >= number_of_results)
+                     & (now - self._stored_at <= self.ttl))
+            best_similarity = -1.0
+            if valid.any():
+                similarities = np.where(valid, self._embeddings @ query_vector, -np.inf)
+                slot = int(np.argmax(similarities))
+                best_similarity = float(similarities[slot])
+                if best_similarity >= self.similarity_threshold:
+                    self.hits += 1
+                    margin = best_similarity - self.similarity_threshold
+                    self._hit_margin_sum += margin
+                    self._min_hit_margin = margin if self._min_hit_margin is None else min(self._min_hit_margin, margin)
+                    self._last_used[slot] = now
+                    return self._entries[slot][1][:number_of_results]
+
+            self.misses += 1
+            if best_similarity >= self.similarity_threshold - NEAR_MISS_MARGIN:
+                self.near_misses += 1
+            return None
+
+    def store(self, knowledge_base_id, query, results, number_of_results):
+        """
+        :param knowledge_base_id: Knowledge base the query was sent to
+        :param query: Query text
+        :param results: retrievalResults returned by retrieve()
+        :param number_of_results: Number of results that was requested
+        """
+        query_vector = self._embed(query)
+        now = time.monotonic()
+        with self._lock:
+            # Reuse an expired slot first, otherwise the least recently used one
+            expired = now - self._stored_at > self.ttl
+            slot = int(np.argmax(expired)) if expired.any() else int(np.argmin(self._last_used))
+            self._embeddings[slot] = query_vector
+            self._knowledge_base_codes[slot] = self._code_of.setdefault(knowledge_base_id, len(self._code_of))
+            self._result_counts[slot] = number_of_results
+            self._entries[slot] = (query, results)
+            self._stored_at[slot] = now
+            self._last_used[slot] = now
+
+    def stats(self):
+        """
+        :return: Dictionary with hits, misses, hit rate, near misses (misses within NEAR_MISS_MARGIN of the
+                 threshold) and the smallest/average margin between the matched similarity and the threshold
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "near_misses": self.near_misses,
+                "min_hit_margin": self._min_hit_margin,
+                "mean_hit_margin": self._hit_margin_sum / self.hits if self.hits else None
+            }
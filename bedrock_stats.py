@@ -0,0 +1,15 @@
+# Statistics shared by the benchmark, load test and profiling helpers.
+
+
+# Function to compute a percentile (nearest-rank method) of a list of values
+def percentile(values, percent):
+    """
+    :param values: List of numbers (need not be sorted)
+    :param percent: Percentile between 0 and 100
+    :return: The smallest value with at least percent % of the values at or below it, or None for an empty list
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))  # Ceiling without floats
+    return ordered[int(rank) - 1]
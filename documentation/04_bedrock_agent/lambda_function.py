@@ -1,59 +1,173 @@
-import json
 import boto3
+import json
 import wikipediaapi
-import datetime
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from log_shipper import FLUSH_TIMEOUT_SECONDS, LogShipper  # log_shipper.py from documentation/lambda_shared, deployed with this function
 
 # Configuration to enable or disable log export
 ENABLE_LOG_EXPORT = False
 
 # S3 bucket configuration
 BUCKET_NAME = 'name-of-your-s3-bucket-for-logging'  # Placeholder for the S3 bucket name
-s3_client = boto3.client('s3')
 
-def export_to_s3(content, filename):
+# Log records are buffered and written to S3 in batches by a background thread, off the request path
+log_shipper = LogShipper(BUCKET_NAME, enabled=ENABLE_LOG_EXPORT)
+
+def log_to_s3(folder='unknown_agent', event=None, response=None, error=None, request_id=None):
     """
-    Exports given content to S3 as a JSON object if logging is enabled.
+    Logs input event, response, or error to S3 if logging is enabled. The records of an invocation share
+    one folder (their 'kind' tells them apart), so they are written to the same object.
 
-    :param content: Content to be exported
-    :param filename: File name in the bucket
+    :param event: The input event to log
+    :param response: The response to log (optional)
+    :param error: The error to log (optional)
+    :param request_id: Request ID of the invocation (optional)
     """
-    if not ENABLE_LOG_EXPORT:
-        print("Log export is disabled. Skipping export to S3.")
-        return
+    if event:
+        log_shipper.log(folder, "input", event, request_id)
 
-    try:
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=filename, Body=json.dumps(content))
-    except Exception as e:
-        print(f"Error exporting to S3: {str(e)}")
+    if response:
+        log_shipper.log(folder, "output", response, request_id)
+
+    if error:
+        log_shipper.log(folder, "error", error, request_id)
+
+# Wikipedia lookup cache. Results (including "not found") are kept in the container between warm
+# invocations and, when CACHE_TABLE_NAME is set, in a DynamoDB table shared by every container.
+# The table needs a string partition key 'cache_key'; enable DynamoDB TTL on the 'expires_at' attribute.
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # Found pages rarely move
+NEGATIVE_CACHE_TTL_SECONDS = 3600  # A missing page may be created, so "not found" is kept for less time
+CACHE_MAX_ENTRIES = 2048
+CACHE_TABLE_NAME = None  # e.g. 'wikipedia-url-cache'
+MAX_LOOKUP_WORKERS = 8
+USER_AGENT = 'LambdaWikipediaLinkFinder (youremail@example.com)'
 
-def log_to_s3(folder='unknown_agent', event=None, response=None, error=None):
+# Wikipedia clients are created once per language and reused by warm invocations
+wiki_clients = {}
+wiki_clients_lock = threading.Lock()
+
+def get_wiki_client(language):
+    with wiki_clients_lock:
+        if language not in wiki_clients:
+            wiki_clients[language] = wikipediaapi.Wikipedia(user_agent=USER_AGENT, language=language)
+        return wiki_clients[language]
+
+class LocalCacheTier:
+    """
+    In-container LRU cache with a TTL per entry. Also usable as a stand-in for the shared tier in tests.
     """
-    Logs input event, response, or error to S3 if logging is enabled.
 
-    :param event: The input event to log
-    :param response: The response to log (optional)
-    :param error: The error to log (optional)
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: Tuple (found, value); value is None for a cached "not found"
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class DynamoDBCacheTier:
+    """
+    Cache shared by all the containers of the function, stored in a DynamoDB table.
     """
-    if not ENABLE_LOG_EXPORT:
-        return
 
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    def __init__(self, table_name):
+        self.table = boto3.resource('dynamodb').Table(table_name)
 
-    try:
-        if event:
-            s3_input_file_name = f"{folder}/input/{timestamp}_input.json"
-            export_to_s3(event, s3_input_file_name)
+    def get(self, key):
+        try:
+            item = self.table.get_item(Key={'cache_key': key}).get('Item')
+        except Exception as e:
+            print(f"Error reading the Wikipedia cache: {str(e)}")
+            return False, None
+        # DynamoDB deletes expired items lazily, so the expiration is checked here too
+        if item is None or int(item['expires_at']) <= time.time():
+            return False, None
+        return True, item.get('url') or None
 
-        if response:
-            s3_output_file_name = f"{folder}/output/{timestamp}_output.json"
-            export_to_s3(response, s3_output_file_name)
+    def put(self, key, value, ttl):
+        try:
+            self.table.put_item(Item={'cache_key': key, 'url': value or '', 'expires_at': int(time.time() + ttl)})
+        except Exception as e:
+            print(f"Error writing the Wikipedia cache: {str(e)}")
 
-        if error:
-            s3_error_file_name = f"{folder}/error/{timestamp}_error.json"
-            export_to_s3(error, s3_error_file_name)
+local_cache = LocalCacheTier()
+shared_cache = DynamoDBCacheTier(CACHE_TABLE_NAME) if CACHE_TABLE_NAME else None
 
-    except Exception as e:
-        print(f"Error logging to S3: {str(e)}")
+def normalize_title(title):
+    """
+    Normalizes a page title the way MediaWiki does: underscores and repeated spaces become one space and
+    the first character is uppercased. The rest keeps its case, since 'Red hat' and 'Red Hat' are different pages.
+
+    :param title: Page title
+    :return: Normalized title, used in the cache keys
+    """
+    title = ' '.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+def split_names(value):
+    """
+    Reads one or several names from a parameter. Names can contain commas (e.g. "Martin Luther King, Jr."),
+    so several names must be given as a JSON list or separated by semicolons.
+
+    :param value: One name, a JSON list of names, or names separated by ';'
+    :return: List of names
+    """
+    value = value.strip()
+    if value.startswith('['):
+        try:
+            names = json.loads(value)
+            if isinstance(names, list):
+                return [str(name).strip() for name in names if str(name).strip()]
+        except ValueError:
+            pass  # Not a JSON list: a name that starts with a bracket
+    return [name.strip() for name in value.split(';') if name.strip()]
+
+def lookup_wikipedia_url(celebrity_name, language='en'):
+    """
+    Returns the URL of the Wikipedia page of a famous person, using the cache tiers before Wikipedia.
+
+    :param celebrity_name: Name of the famous person
+    :param language: Language of the Wikipedia page
+    :return: URL to the Wikipedia page, or None if it does not exist
+    """
+    key = f"{language}:{normalize_title(celebrity_name)}"
+    found, url = local_cache.get(key)
+    if found:
+        return url
+    if shared_cache is not None:
+        found, url = shared_cache.get(key)
+        if found:
+            local_cache.put(key, url, CACHE_TTL_SECONDS if url else NEGATIVE_CACHE_TTL_SECONDS)
+            return url
+
+    page = get_wiki_client(language).page(celebrity_name)
+    url = page.fullurl if page.exists() else None
+    ttl = CACHE_TTL_SECONDS if url else NEGATIVE_CACHE_TTL_SECONDS
+    local_cache.put(key, url, ttl)
+    if shared_cache is not None:
+        shared_cache.put(key, url, ttl)
+    return url
 
 def get_wikipedia_url(celebrity_name, language='en'):
     """
@@ -63,15 +177,25 @@ def get_wikipedia_url(celebrity_name, language='en'):
     :param language: Language of the Wikipedia page
     :return: URL to the Wikipedia page or a message indicating it was not found
     """
-    user_agent = 'LambdaWikipediaLinkFinder (youremail@example.com)'
-    wiki = wikipediaapi.Wikipedia(user_agent=user_agent, language=language)
-    page = wiki.page(celebrity_name)
-    
-    if page.exists():
-        return page.fullurl
+    url = lookup_wikipedia_url(celebrity_name, language)
+    if url:
+        return url
     else:
         return f"The Wikipedia page for '{celebrity_name}' was not found."
 
+def get_wikipedia_urls(celebrity_names, languages=('en',)):
+    """
+    Resolves several names in several languages concurrently.
+
+    :param celebrity_names: List of names
+    :param languages: List of languages
+    :return: Dictionary {(celebrity_name, language): URL or not-found message}
+    """
+    pairs = [(name, language) for name in celebrity_names for language in languages]
+    with ThreadPoolExecutor(max_workers=MAX_LOOKUP_WORKERS) as executor:
+        urls = executor.map(lambda pair: get_wikipedia_url(*pair), pairs)
+        return dict(zip(pairs, urls))
+
 def lambda_handler(event, context):
     """
     Lambda function to find the Wikipedia link for a famous person and log the result to S3.
@@ -102,7 +226,15 @@ def lambda_handler(event, context):
             raise ValueError("Missing required parameter: celebrity_name")
 
         # Business logic execution
-        wikipedia_url = get_wikipedia_url(celebrity_name, language)
+        # Several names can be requested at once as a JSON list or separated by semicolons (e.g. "Pelé; Garrincha"),
+        # and several languages separated by commas (e.g. "en,pt")
+        celebrity_names = split_names(celebrity_name)
+        languages = [code.strip() for code in language.split(',') if code.strip()] or ['en']
+        if len(celebrity_names) == 1 and len(languages) == 1:
+            wikipedia_url = get_wikipedia_url(celebrity_names[0], languages[0])
+        else:
+            urls = get_wikipedia_urls(celebrity_names, languages)
+            wikipedia_url = "\n".join(f"{name} ({code}): {url}" for (name, code), url in urls.items())
         
         response_body = {
             "TEXT": {
@@ -122,7 +254,8 @@ def lambda_handler(event, context):
         function_response = {'response': response, 'messageVersion': event['messageVersion']}
 
         # Log input and response to S3
-        log_to_s3(folder=agent_name, event=event, response=function_response)
+        log_to_s3(folder=agent_name, event=event, response=function_response,
+                  request_id=getattr(context, 'aws_request_id', None))
 
         return function_response
     except Exception as e:
@@ -133,6 +266,10 @@ def lambda_handler(event, context):
         }
 
         # Log input and error to S3
-        log_to_s3(folder=agent_name, event=event, error=error_response)
+        log_to_s3(folder=agent_name, event=event, error=error_response,
+                  request_id=getattr(context, 'aws_request_id', None))
 
         return error_response
+    finally:
+        # Write the buffered logs if a batch is due, before the environment can be frozen (waits at most FLUSH_TIMEOUT_SECONDS)
+        log_shipper.flush(only_if_due=True, timeout=FLUSH_TIMEOUT_SECONDS)
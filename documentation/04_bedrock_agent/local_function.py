@@ -23,9 +23,10 @@ def get_wikipedia_url(celebrity_name, language='en'):
     else:
         return f"The Wikipedia page for '{celebrity_name}' was not found."
 
-# Example usage
-celebrity_name = "Pelé"
-language = 'en'
-print(get_wikipedia_url(celebrity_name, language))  # Output: URL to the Wikipedia page of Albert Einstein
+# Example usage (skipped when the function is imported, e.g. by 04_bedrock_agent.py in return-of-control mode)
+if __name__ == "__main__":
+    celebrity_name = "Pelé"
+    language = 'en'
+    print(get_wikipedia_url(celebrity_name, language))  # Output: URL to the Wikipedia page of Albert Einstein
 
 
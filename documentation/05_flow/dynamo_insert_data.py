@@ -1,13 +1,32 @@
-import boto3
+import argparse
+import queue
+import random
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
-import random
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
 
-# Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+# Bulk loader of sample orders into the VeganSweetOrders table.
+#
+# Usage:
+#   python dynamo_insert_data.py                                   # 25 orders, as in the tutorial
+#   python dynamo_insert_data.py --count 1000000 --workers 16 --seed 42 --workload-file order_workload.txt
+#
+# Orders are generated from the seed, so the same seed and reference date always produce the same
+# orders. They are written with batch_write_item (25 items per request) by parallel workers. The
+# generator waits when the workers fall behind (bounded queue), and items left unprocessed by
+# DynamoDB, throttled requests and connection errors are retried with backoff. A random sample of the generated order IDs, one per line, can be
+# written to a workload file for benchmarking lambda_query_order_status.
 
-# Select the table
-table = dynamodb.Table("VeganSweetOrders")
+TABLE_NAME = "VeganSweetOrders"
+BATCH_SIZE = 25  # Limit of items in one batch_write_item request
+MAX_BATCH_ATTEMPTS = 8
+PROGRESS_INTERVAL_SECONDS = 5
+RETRYABLE_ERRORS = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded",
+                    "InternalServerError"}
 
 # Sample order statuses
 statuses = ["Processing", "Shipped", "Delivered", "Cancelled"]
@@ -24,17 +43,174 @@ descriptions = [
     "Oatmeal raisin cookies"
 ]
 
-# Generate and insert 25 sample records
-for _ in range(25):
-    order_data = {
-        "order_id": str(uuid.uuid4()),  # Generate a unique ID
-        "order_date": (datetime.now(timezone.utc) - timedelta(days=random.randint(1, 30))).strftime("%Y-%m-%d"),
-        "status": random.choice(statuses),
-        "description": random.choice(descriptions),
-        "customer_id": str(random.randint(1000, 9999)),  # Random customer ID
-        "rating": random.randint(1, 5)  # Random rating from 1 to 5
-    }
 
-    table.put_item(Item=order_data)
+# Function to generate sample orders, one at a time
+def generate_orders(count, seed=None, reference_date=None):
+    """
+    :param count: Number of orders
+    :param seed: Random seed (None for different orders on every run)
+    :param reference_date: Orders are dated 1 to 30 days before this date (today in UTC by default)
+    :return: Generator of order dictionaries
+    """
+    rng = random.Random(seed)
+    reference_date = reference_date or datetime.now(timezone.utc)
+    for _ in range(count):
+        yield {
+            "order_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),  # Unique ID derived from the seed
+            "order_date": (reference_date - timedelta(days=rng.randint(1, 30))).strftime("%Y-%m-%d"),
+            "status": rng.choice(statuses),
+            "description": rng.choice(descriptions),
+            "customer_id": str(rng.randint(1000, 9999)),  # Random customer ID
+            "rating": rng.randint(1, 5)  # Random rating from 1 to 5
+        }
+
+
+# Function to convert an order to the attribute-value format of the DynamoDB client
+def to_dynamodb_item(order):
+    return {name: {"N": str(value)} if isinstance(value, int) else {"S": value} for name, value in order.items()}
+
+
+class BulkLoader:
+    """
+    Writes items to a DynamoDB table with batch_write_item from a pool of worker threads.
+    """
+
+    def __init__(self, dynamodb_client, table_name=TABLE_NAME, workers=8, queue_batches=None):
+        """
+        :param dynamodb_client: 'dynamodb' client (clients can be shared by threads, resources cannot)
+        :param table_name: Table name
+        :param workers: Number of threads writing at the same time
+        :param queue_batches: Batches waiting for a worker before the producer blocks (4 per worker by default)
+        """
+        self.dynamodb_client = dynamodb_client
+        self.table_name = table_name
+        self.workers = workers
+        self.batches = queue.Queue(maxsize=queue_batches or workers * 4)
+        self.written = 0
+        self.retried = 0  # Items sent again because DynamoDB left them unprocessed or throttled the request
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def load(self, items, on_progress=None):
+        """
+        :param items: Iterable of items in the attribute-value format
+        :param on_progress: Optional function called with the loader every PROGRESS_INTERVAL_SECONDS
+        :return: Elapsed seconds
+        """
+        start_time = time.perf_counter()
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        last_report = start_time
+        batch = []
+        for item in items:
+            batch.append({"PutRequest": {"Item": item}})
+            if len(batch) == BATCH_SIZE:
+                self.batches.put(batch)  # Blocks while the queue is full: the generator waits for the writers
+                batch = []
+                if on_progress and time.perf_counter() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                    last_report = time.perf_counter()
+                    on_progress(self, last_report - start_time)
+        if batch:
+            self.batches.put(batch)
+        for _ in threads:
+            self.batches.put(None)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start_time
+
+    def _worker(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            self._write_batch(batch)
+
+    def _write_batch(self, requests):
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            if attempt:
+                # The table is throttling: back off (with jitter) before sending the rest again
+                time.sleep(random.uniform(0.5, 1.0) * min(0.05 * 2 ** attempt, 5.0))
+                with self._lock:
+                    self.retried += len(requests)
+            try:
+                response = self.dynamodb_client.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in RETRYABLE_ERRORS:
+                    print(f"Error writing batch: {e}")
+                    break
+                unprocessed = requests
+            except (ConnectionError, HTTPClientError):
+                unprocessed = requests  # Connection failures and read timeouts are transient
+            except Exception as e:
+                # Any other failure is counted for this batch: a dead worker would leave the producer blocked on the queue
+                print(f"Error writing batch: {e}")
+                break
+            with self._lock:
+                self.written += len(requests) - len(unprocessed)
+            if not unprocessed:
+                return
+            requests = unprocessed
+        with self._lock:
+            self.failed += len(requests)
+
+
+# Function to keep a uniform random sample of the order IDs while they are generated (reservoir sampling)
+def sample_order_ids(orders, sample, sample_size, seed=None):
+    """
+    :param orders: Iterable of orders
+    :param sample: List receiving the sampled order IDs
+    :param sample_size: Maximum size of the sample
+    :return: Generator yielding the same orders
+    """
+    rng = random.Random(seed)
+    for index, order in enumerate(orders):
+        if len(sample) < sample_size:
+            sample.append(order["order_id"])
+        else:
+            position = rng.randint(0, index)
+            if position < sample_size:
+                sample[position] = order["order_id"]
+        yield order
+
+
+# Function to print the progress of the load
+def print_progress(loader, elapsed):
+    print(f"{loader.written} items written in {elapsed:.1f}s ({loader.written / elapsed if elapsed else 0:.0f} items/s), "
+          f"{loader.retried} retried, {loader.failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate sample orders and write them to the VeganSweetOrders table")
+    parser.add_argument("--count", type=int, default=25, help="Number of orders (default: 25)")
+    parser.add_argument("--seed", type=int, help="Random seed, for reproducible orders")
+    parser.add_argument("--reference-date", help="Orders are dated up to 30 days before this date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel writers (default: 8)")
+    parser.add_argument("--table", default=TABLE_NAME, help=f"Table name (default: {TABLE_NAME})")
+    parser.add_argument("--workload-file", help="Write a sample of the generated order IDs to this file, one per line")
+    parser.add_argument("--sample-size", type=int, default=1000, help="Order IDs in the workload file (default: 1000)")
+    args = parser.parse_args()
+
+    reference = (datetime.strptime(args.reference_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+                 if args.reference_date else None)
+
+    # Initialize the DynamoDB client, with one connection per worker
+    dynamodb = boto3.client('dynamodb', config=Config(max_pool_connections=max(10, args.workers)))
+    loader = BulkLoader(dynamodb, args.table, args.workers)
+
+    order_stream = generate_orders(args.count, args.seed, reference)
+    workload = []
+    if args.workload_file:
+        order_stream = sample_order_ids(order_stream, workload, args.sample_size, args.seed)
+
+    elapsed = loader.load((to_dynamodb_item(order) for order in order_stream), on_progress=print_progress)
+    print_progress(loader, elapsed)
+
+    if args.workload_file:
+        with open(args.workload_file, "w", encoding="utf-8") as workload_file:
+            workload_file.write("".join(f"{order_id}\n" for order_id in workload))
+        print(f"{len(workload)} order IDs written to {args.workload_file}.")
 
-print("Sample data inserted into the table.")
+    print("Sample data inserted into the table.")
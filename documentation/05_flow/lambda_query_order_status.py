@@ -1,42 +1,112 @@
 import json
+import os
+import random
+import time
+from collections import OrderedDict
 import boto3
-import datetime
-
-# Initialize AWS Clients
-dynamodb_client = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+from log_shipper import FLUSH_TIMEOUT_SECONDS, LogShipper  # log_shipper.py from documentation/lambda_shared, deployed with this function
 
 # Configuration
 TABLE_NAME = "VeganSweetOrders"
 ENABLE_LOG_EXPORT = False # Configuration to enable or disable log export
 BUCKET_NAME = 'name-of-your-s3-bucket-for-logging'  # Placeholder for the S3 bucket name
+CACHE_TTL_SECONDS = 30  # Statuses change, so a hot order is only served from the container for a short time
+CACHE_MAX_ENTRIES = 10000
+MAX_BATCH_KEYS = 100  # Limit of keys in one batch_get_item request
+MAX_BATCH_ATTEMPTS = 5  # Requests per chunk while DynamoDB returns UnprocessedKeys
+
+# Initialize AWS Clients
+# Set DYNAMODB_ENDPOINT_URL to use a local DynamoDB (e.g. http://localhost:8000) instead of the AWS service
+dynamodb_client = boto3.resource('dynamodb', endpoint_url=os.environ.get('DYNAMODB_ENDPOINT_URL'))
+
+# Log records are buffered and written to S3 in batches by a background thread, off the request path
+log_shipper = LogShipper(BUCKET_NAME, enabled=ENABLE_LOG_EXPORT)
 
-# Reference to the DynamoDB table
-table = dynamodb_client.Table(TABLE_NAME)
+# Statuses read by earlier invocations of this container: order_id -> (status, expires_at)
+status_cache = OrderedDict()
 
-def export_to_s3(content, filename):
+def parse_order_ids(value):
     """
-    Exports content to an S3 bucket.
-    
-    :param content: Content to be saved
-    :param filename: File name path in the bucket
+    Reads the order IDs of the node input.
+
+    :param value: One order ID, several separated by commas, or a JSON list (as a string or a list)
+    :return: List of order IDs in input order, without duplicates
     """
-    if not ENABLE_LOG_EXPORT:
-        print("Log export is disabled. Skipping export to S3.")
-        return
+    if isinstance(value, str):
+        value = value.strip()
+        value = json.loads(value) if value.startswith("[") else value.split(",")
+    order_ids = (str(order_id).strip() for order_id in value)
+    return list(dict.fromkeys(order_id for order_id in order_ids if order_id))
 
-    try:
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=filename, Body=json.dumps(content))
-    except Exception as e:
-        print(f"Error exporting to S3: {str(e)}")
+def batch_get_statuses(order_ids, dynamodb=None):
+    """
+    Reads the status of many orders with batch_get_item, only fetching the key and the status.
+
+    :param order_ids: List of order IDs
+    :param dynamodb: DynamoDB service resource (the module's by default)
+    :return: Dictionary {order_id: status} of the orders found
+    :raises RuntimeError: If some keys are still unprocessed after MAX_BATCH_ATTEMPTS requests
+    """
+    dynamodb = dynamodb or dynamodb_client
+    statuses = {}
+    for start in range(0, len(order_ids), MAX_BATCH_KEYS):
+        request_items = {TABLE_NAME: {
+            "Keys": [{"order_id": order_id} for order_id in order_ids[start:start + MAX_BATCH_KEYS]],
+            "ProjectionExpression": "order_id, #status",
+            "ExpressionAttributeNames": {"#status": "status"}  # 'status' is a DynamoDB reserved word
+        }}
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(TABLE_NAME, []):
+                statuses[item["order_id"]] = item.get("status", "Unknown")
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+            if attempt == MAX_BATCH_ATTEMPTS - 1:
+                unprocessed = len(request_items.get(TABLE_NAME, {}).get("Keys", []))
+                raise RuntimeError(f"{unprocessed} order IDs still unprocessed after {MAX_BATCH_ATTEMPTS} attempts")
+            # Unprocessed keys mean the table is throttling: back off (with jitter) before asking again
+            time.sleep(random.uniform(0.5, 1.0) * min(0.05 * 2 ** attempt, 1.0))
+    return statuses
+
+def get_order_statuses(order_ids, dynamodb=None):
+    """
+    Returns the status of each order, from the container cache when it is fresh and from DynamoDB otherwise.
+
+    :param order_ids: List of order IDs
+    :param dynamodb: DynamoDB service resource (the module's by default)
+    :return: Dictionary {order_id: status}, with "Unknown" for orders that do not exist
+    """
+    now = time.time()
+    statuses = {}
+    missing = []
+    for order_id in order_ids:
+        cached = status_cache.get(order_id)
+        if cached and cached[1] > now:
+            status_cache.move_to_end(order_id)
+            statuses[order_id] = cached[0]
+        else:
+            missing.append(order_id)
+
+    if missing:
+        found = batch_get_statuses(missing, dynamodb)
+        expires_at = time.time() + CACHE_TTL_SECONDS
+        for order_id in missing:
+            statuses[order_id] = found.get(order_id, "Unknown")
+            status_cache[order_id] = (statuses[order_id], expires_at)
+            status_cache.move_to_end(order_id)
+        while len(status_cache) > CACHE_MAX_ENTRIES:
+            status_cache.popitem(last=False)
+
+    return {order_id: statuses[order_id] for order_id in order_ids}
 
 def lambda_handler(event, context):
     """
-    Lambda function to retrieve an order status from DynamoDB and log the event to S3.
+    Lambda function to retrieve order statuses from DynamoDB and log the event to S3.
 
     :param event: Incoming event payload
     :param context: AWS Lambda context
-    :return: Order status or "Unknown" if not found
+    :return: Order status or "Unknown" if not found; with several order IDs, a dictionary {order_id: status}
     """
     try:
         # Log the received event
@@ -50,35 +120,34 @@ def lambda_handler(event, context):
 
         # Determine which input to use (inspired by the provided logic)
         if len(inputs) == 1:
-            order_id = inputs[0].get("value")
+            order_value = inputs[0].get("value")
         else:
-            order_id = next((item["value"] for item in inputs if item["name"] == "codeHookInput"), None)
+            order_value = next((item["value"] for item in inputs if item["name"] == "codeHookInput"), None)
 
         # Validate order_id
-        if not order_id:
+        order_ids = parse_order_ids(order_value) if order_value else []
+        if not order_ids:
             print("Error: Missing order_id in event payload")
             return "Unknown"
-        # Query DynamoDB for the order status
-        response = table.get_item(Key={'order_id': order_id})
-
-        # Extract order status or return "Unknown"
-        order_status = response.get('Item', {}).get('status', "Unknown")
 
-        # Generate timestamped log file name
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S')
-        file_path = f"flow/dynamo/{alias_id}/{timestamp}.json"
+        # Query DynamoDB for the order statuses ("Unknown" for orders not found)
+        order_statuses = get_order_statuses(order_ids)
 
         # Log the event to S3
-        export_to_s3(event, file_path)
+        log_shipper.log(f"flow/dynamo/{alias_id}", "input", event, getattr(context, 'aws_request_id', None))
 
-        return order_status
+        if len(order_ids) == 1:
+            return order_statuses[order_ids[0]]
+        return order_statuses
 
     except Exception as e:
         print("Error:", str(e))
 
         # Log error details to S3
         error_msg = {"error": str(e)}
-        error_path = "flow/dynamo/errors/" + datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S') + ".json"
-        export_to_s3(error_msg, error_path)
+        log_shipper.log("flow/dynamo/errors", "error", error_msg, getattr(context, 'aws_request_id', None))
 
-        return "Unknown"
\ No newline at end of file
+        return "Unknown"
+    finally:
+        # Write the buffered logs if a batch is due, before the environment can be frozen (waits at most FLUSH_TIMEOUT_SECONDS)
+        log_shipper.flush(only_if_due=True, timeout=FLUSH_TIMEOUT_SECONDS)
@@ -1,29 +1,245 @@
 import json
-import boto3
-import datetime
-
-# Initialize AWS Clients
-s3_client = boto3.client('s3')
+import re
+from log_shipper import FLUSH_TIMEOUT_SECONDS, LogShipper  # log_shipper.py from documentation/lambda_shared, deployed with this function
 
 # Configuration for log export
 ENABLE_LOG_EXPORT = False # Configuration to enable or disable log export
 BUCKET_NAME = 'name-of-your-s3-bucket-for-logging'  # Placeholder for the S3 bucket name
 
-def export_to_s3(content, filename):
+# Log records are buffered and written to S3 in batches by a background thread, off the request path
+log_shipper = LogShipper(BUCKET_NAME, enabled=ENABLE_LOG_EXPORT)
+
+
+# Validation of the classifier output (see Step 4.3 of 05_flow.md)
+ENABLE_SCHEMA_VALIDATION = True
+INTENT_SCHEMA = {
+    "type": "object",
+    "required": ["intent", "language"],
+    "properties": {
+        "intent": {"type": "string", "enum": ["orderStatus", "businessInfo", "other"]},
+        "language": {"type": "string"},
+        "orderId": {"type": ["string", "null"]}
+    }
+}
+
+# Characters that need attention outside and inside JSON strings; everything else is copied in runs
+OUTSIDE_STRING = re.compile(r'[{}\[\]",\s]')
+INSIDE_STRING = re.compile(r'["\\\n\r\t]')
+CLOSERS = {"{": "}", "[": "]"}
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+JSON_TYPES = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "null": (type(None),)
+}
+
+
+class JsonExtractor:
     """
-    Exports content to a JSON file in S3.
-    
-    :param content: Content to be exported
-    :param filename: File name in the bucket
+    Extracts the first JSON object from model output, in a single pass over the text.
+
+    Text before the object (prose, a ```json code fence) and after it is ignored. Common defects are
+    repaired on the way: trailing commas are dropped and raw line breaks or tabs inside strings are
+    escaped. When the text ends before the object does (truncated output), finish() cuts back to the
+    last complete member and closes the brackets. A member whose value may have been cut short (a
+    string, number or literal still being written) is dropped rather than closed, so a truncated
+    "orderId": "12 never becomes a valid but wrong value; validation then reports missing required keys.
+
+    The text can be fed in chunks as it is streamed; feed() returns the object as soon as it is complete.
     """
-    if not ENABLE_LOG_EXPORT:
-        print("Log export is disabled. Skipping export to S3.")
-        return
 
-    try:
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=filename, Body=json.dumps(content))
-    except Exception as e:
-        print(f"Error exporting to S3: {str(e)}")
+    def __init__(self):
+        self.value = None
+        self.done = False
+        self.repaired = False
+        self._reset()
+
+    def _reset(self):
+        self._parts = []
+        self._length = 0
+        self._stack = []  # Expected closing brackets
+        self._in_string = False
+        self._escape = False
+        self._pending_comma = False  # Written only if another member follows
+        self._safe_point = None  # (length, stack) after the opening brace or before the last comma: the text up to it is complete
+
+    def _emit(self, text):
+        if self._pending_comma:
+            self._pending_comma = False
+            self._parts.append(",")
+            self._length += 1
+        self._parts.append(text)
+        self._length += len(text)
+
+    def feed(self, chunk):
+        """
+        :param chunk: Next piece of the text
+        :return: The object once it is complete, otherwise None
+        """
+        pos = 0
+        end_of_chunk = len(chunk)
+        while pos < end_of_chunk and not self.done:
+            if not self._stack:
+                start = chunk.find("{", pos)
+                if start == -1:
+                    break
+                self._stack.append("}")
+                self._emit("{")
+                self._safe_point = (self._length, list(self._stack))
+                pos = start + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._emit(chunk[pos])
+                    pos += 1
+                    continue
+                match = INSIDE_STRING.search(chunk, pos)
+                end = match.start() if match else end_of_chunk
+                if end > pos:
+                    self._emit(chunk[pos:end])
+                if not match:
+                    break
+                char = match.group()
+                pos = end + 1
+                if char == '"':
+                    self._in_string = False
+                    self._emit(char)
+                elif char == "\\":
+                    self._escape = True
+                    self._emit(char)
+                else:
+                    self.repaired = True
+                    self._emit(CONTROL_ESCAPES[char])
+            else:
+                match = OUTSIDE_STRING.search(chunk, pos)
+                end = match.start() if match else end_of_chunk
+                if end > pos:
+                    self._emit(chunk[pos:end])
+                if not match:
+                    break
+                char = match.group()
+                pos = end + 1
+                if char == '"':
+                    self._in_string = True
+                    self._emit(char)
+                elif char == ",":
+                    self._safe_point = (self._length, list(self._stack))
+                    self._pending_comma = True
+                elif char in CLOSERS:
+                    self._emit(char)
+                    self._stack.append(CLOSERS[char])
+                elif char in "}]":
+                    if self._pending_comma:
+                        self._pending_comma = False
+                        self.repaired = True
+                    self._parts.append(self._stack.pop())
+                    self._length += 1
+                    if not self._stack:
+                        self._complete()
+                # Whitespace between tokens is dropped
+        return self.value
+
+    def _complete(self):
+        try:
+            self.value = json.loads("".join(self._parts))
+            self.done = True
+        except ValueError:
+            # Braces in the prose, not JSON: keep looking after them
+            self.repaired = False
+            self._reset()
+
+    def finish(self):
+        """
+        Ends the text, repairing a truncated object.
+
+        :return: The object, or None if the text has none
+        """
+        if self.done or not self._stack:
+            return self.value
+        text = "".join(self._parts)
+        candidates = []
+        if not self._in_string and text[-1:] in ('"', "}", "]"):
+            # The text ends with a complete value (or key); a number or literal at the end may be cut short
+            candidates.append(text + "".join(reversed(self._stack)))
+        if self._safe_point:
+            length, stack = self._safe_point
+            candidates.append(text[:length] + "".join(reversed(stack)))
+        for candidate in candidates:
+            try:
+                self.value = json.loads(candidate)
+                self.done = True
+                self.repaired = True
+                break
+            except ValueError:
+                pass
+        return self.value
+
+
+# Function to extract the JSON object of a complete text
+def extract_json(text):
+    """
+    :param text: Model output
+    :return: Parsed object, or None if the text has none
+    """
+    extractor = JsonExtractor()
+    return extractor.feed(text) or extractor.finish()
+
+
+# Function to normalize an enum value for comparison: "ORDER_STATUS", "order status" and "orderStatus" match
+def normalize_enum(value):
+    return re.sub(r"[\s_-]", "", value).lower()
+
+
+# Function to build the validator of a schema once, instead of interpreting the schema on every call
+def compile_schema(schema, path="$"):
+    """
+    Supports the subset of JSON Schema used by INTENT_SCHEMA: type, enum, required and properties.
+    String enum values are matched with normalize_enum and replaced by their spelling in the schema.
+
+    :param schema: Schema dictionary
+    :param path: Path of the validated value, used in the error messages
+    :return: Function(value) -> (value with enum spellings fixed, list of error messages)
+    """
+    type_names = schema.get("type")
+    if isinstance(type_names, str):
+        type_names = [type_names]
+    allowed_types = tuple(python_type for name in type_names for python_type in JSON_TYPES[name]) if type_names else None
+    allows_bool = bool(type_names) and "boolean" in type_names
+    enum = None
+    if "enum" in schema:
+        enum = {normalize_enum(value) if isinstance(value, str) else value: value for value in schema["enum"]}
+    required = tuple(schema.get("required", ()))
+    properties = {name: compile_schema(subschema, f"{path}.{name}")
+                  for name, subschema in schema.get("properties", {}).items()}
+
+    def validate(value):
+        if allowed_types is not None and (not isinstance(value, allowed_types)
+                                          or (isinstance(value, bool) and not allows_bool)):
+            return value, [f"{path}: expected {' or '.join(type_names)}"]
+        if enum is not None:
+            key = normalize_enum(value) if isinstance(value, str) else value
+            if key not in enum:
+                return value, [f"{path}: {value!r} is not one of {list(enum.values())}"]
+            value = enum[key]
+        errors = []
+        if isinstance(value, dict):
+            errors.extend(f"{path}.{name}: required" for name in required if name not in value)
+            if properties:
+                value = dict(value)
+                for name, validate_property in properties.items():
+                    if name in value:
+                        value[name], property_errors = validate_property(value[name])
+                        errors.extend(property_errors)
+        return value, errors
+
+    return validate
+
+
+validate_intent = compile_schema(INTENT_SCHEMA)
 
 
 def lambda_handler(event, context):
@@ -54,15 +270,19 @@ def lambda_handler(event, context):
         if not value_str:
             raise ValueError("Field 'value' not found within 'inputs'")
         
-        # Decoding the JSON string inside the value
-        parsed_json = json.loads(value_str)
-        
-        # Generating timestamp for file name
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S')
-        file_path = f"flow/parser/{alias_id}/{timestamp}.json"
+        # Extracting the JSON object from the model output (prose, code fences and truncation are tolerated)
+        parsed_json = extract_json(value_str)
+        if parsed_json is None:
+            raise ValueError("No JSON object found in 'value'")
+
+        # Validating the classifier output
+        if ENABLE_SCHEMA_VALIDATION:
+            parsed_json, errors = validate_intent(parsed_json)
+            if errors:
+                raise ValueError("Invalid intent payload: " + "; ".join(errors))
         
         # Exporting to S3
-        export_to_s3(event, file_path)
+        log_shipper.log(f"flow/parser/{alias_id}", "input", event, getattr(context, 'aws_request_id', None))
         
         return parsed_json
     except Exception as e:
@@ -70,7 +290,9 @@ def lambda_handler(event, context):
         print(f"Error processing Lambda: {str(e)}")
         
         # Ensure error is also logged in S3 for debugging
-        error_path = "flow/parser/errors/" + datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S') + ".json"
-        export_to_s3(error_msg, error_path)
+        log_shipper.log("flow/parser/errors", "error", error_msg, getattr(context, 'aws_request_id', None))
         
         return error_msg
+    finally:
+        # Write the buffered logs if a batch is due, before the environment can be frozen (waits at most FLUSH_TIMEOUT_SECONDS)
+        log_shipper.flush(only_if_due=True, timeout=FLUSH_TIMEOUT_SECONDS)
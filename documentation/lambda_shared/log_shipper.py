@@ -0,0 +1,167 @@
+import atexit
+import datetime
+import gzip
+import json
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+import boto3
+
+# Shared S3 log export of the tutorial Lambda functions.
+#
+# Deploy this file next to the lambda_function.py of each function (or in a Lambda layer, under python/).
+# Records of many invocations are buffered in memory and written as gzip-compressed JSONL objects:
+#   <folder>/dt=YYYY-MM-DD/hour=HH/<timestamp>-<unique id>.jsonl.gz
+# A batch is written when it reaches MAX_BATCH_RECORDS or MAX_BATCH_BYTES, or when its oldest record is
+# MAX_BATCH_AGE_SECONDS old. The background thread that writes due batches is paused while the Lambda
+# environment is frozen, so each handler ends with flush(only_if_due=True, timeout=FLUSH_TIMEOUT_SECONDS):
+# most invocations return at once, and the one that completes a batch starts its upload and waits for
+# it at most that long (an upload still running when the environment freezes completes when it is
+# thawed). Records that are not due yet wait for a later invocation; SIGTERM (only sent when an
+# extension is registered) and interpreter exit flush them as a best effort, so an environment shut
+# down without notice loses at most the records of the last MAX_BATCH_AGE_SECONDS.
+
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 1024 * 1024  # Uncompressed size of the buffered records
+MAX_BATCH_AGE_SECONDS = 30
+FLUSH_TIMEOUT_SECONDS = 0.5  # Longest wait for S3 at the end of an invocation that completes a batch
+
+
+class LogShipper:
+    """
+    Buffered, batched and asynchronous export of log records to S3.
+    """
+
+    def __init__(self, bucket_name, enabled=True, s3_client=None, max_records=MAX_BATCH_RECORDS,
+                 max_bytes=MAX_BATCH_BYTES, max_age=MAX_BATCH_AGE_SECONDS):
+        """
+        :param bucket_name: S3 bucket receiving the logs
+        :param enabled: When False, log() does nothing
+        :param s3_client: Optional S3 client (created on first upload by default)
+        :param max_records: Number of buffered records that triggers a write
+        :param max_bytes: Buffered size that triggers a write
+        :param max_age: Age in seconds of the oldest buffered record that triggers a write
+        """
+        self.bucket_name = bucket_name
+        self.enabled = enabled
+        self.s3_client = s3_client
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._buffers = {}  # folder -> list of JSON lines
+        self._records = 0
+        self._bytes = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._uploader = None  # Single thread running the uploads started by flush(timeout=...)
+        if enabled:
+            atexit.register(self.flush)
+            self._flush_on_sigterm()
+
+    def log(self, folder, kind, content, request_id=None):
+        """
+        Adds a record to the buffer and returns immediately.
+
+        :param folder: Prefix of the objects in the bucket (e.g. the agent name or 'flow/parser/<alias>')
+        :param kind: Type of record (e.g. 'input', 'output', 'error')
+        :param content: JSON-serializable content
+        :param request_id: Optional request ID of the invocation (context.aws_request_id)
+        """
+        if not self.enabled:
+            return
+        line = json.dumps({
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "kind": kind,
+            "request_id": request_id,
+            "content": content
+        }, default=str)
+        with self._lock:
+            self._buffers.setdefault(folder, []).append(line)
+            self._records += 1
+            self._bytes += len(line)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._records >= self.max_records or self._bytes >= self.max_bytes
+        self._start_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self, only_if_due=False, timeout=None):
+        """
+        Writes the buffered records to S3.
+
+        :param only_if_due: Only write when a size or age threshold has been reached
+        :param timeout: None to write in the calling thread; otherwise the write runs on a background
+                        thread and the caller waits for it at most timeout seconds
+        :return: True if the buffered records were written (or there were none) before returning
+        """
+        with self._lock:
+            if not self._buffers:
+                return True
+            due = (self._records >= self.max_records or self._bytes >= self.max_bytes
+                   or time.monotonic() - self._oldest >= self.max_age)
+            if only_if_due and not due:
+                return True
+            batches, self._buffers = self._buffers, {}
+            self._records, self._bytes, self._oldest = 0, 0, None
+            if timeout is not None and self._uploader is None:
+                self._uploader = ThreadPoolExecutor(max_workers=1)
+        if timeout is None:
+            self._upload_batches(batches)
+            return True
+        done, _ = wait([self._uploader.submit(self._upload_batches, batches)], timeout=timeout)
+        return bool(done)
+
+    def _upload_batches(self, batches):
+        for folder, lines in batches.items():
+            self._upload(folder, lines)
+
+    def _upload(self, folder, lines):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Microsecond timestamp plus a random suffix: concurrent containers never overwrite each other
+        key = (f"{folder}/dt={now:%Y-%m-%d}/hour={now:%H}/"
+               f"{now:%Y%m%dT%H%M%S%fZ}-{uuid.uuid4().hex}.jsonl.gz")
+        body = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        try:
+            if self.s3_client is None:
+                self.s3_client = boto3.client('s3')
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=body,
+                                      ContentType="application/x-ndjson", ContentEncoding="gzip")
+        except Exception as e:
+            print(f"Error exporting {len(lines)} log records to S3: {str(e)}")
+
+    def _start_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # While the Lambda environment is frozen this thread is paused too; it resumes with the next invocation
+        while True:
+            self._wakeup.wait(timeout=self.max_age)
+            self._wakeup.clear()
+            self.flush(only_if_due=True)
+
+    def _flush_on_sigterm(self):
+        # Lambda sends SIGTERM before shutting down an environment only when an extension is registered
+        try:
+            previous_handler = signal.getsignal(signal.SIGTERM)
+
+            def on_sigterm(signum, frame):
+                self.flush()
+                if callable(previous_handler):
+                    previous_handler(signum, frame)
+                else:
+                    sys.exit(0)
+
+            signal.signal(signal.SIGTERM, on_sigterm)
+        except ValueError:
+            pass  # Signal handlers can only be installed from the main thread; atexit still applies